@@ -1,13 +1,26 @@
 import requests
+from http_fetch import fetch_text, fetch_text_async
 import warnings
-import pandas as pd
-from bs4 import BeautifulSoup
-from datetime import datetime
-import numpy as np
+from html_parsers import make_soup
 import re
+import asyncio
+from html import escape
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+from bisect import bisect_left
+from ccr_cache import CCRPageCache
+from case_schema import CASE_MATCHERS
+from date_parsing import DATE_PARSER
+from business_days import business_day_gaps
+from report_cache import BuildBody, ReportCache
+from http_fetch import fetch_listeners
+from metrics import instrument, timed, observe_fetch, register_cache, render_prometheus
 
 warnings.filterwarnings("ignore")
 
+# Every upstream fetch feeds the fetch histogram and retry counter on /metrics
+fetch_listeners.append(observe_fetch)
+
 def generate_url(case_no):
     base_url1 = "http://cdsinfo.cadence.com/cgi-bin/cdsinfoprod?input="
     base_url2 = "&type=_&codmode=p"
@@ -16,76 +29,129 @@ def generate_url(case_no):
 
 def fetch_url_content(url):
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise exception for bad response status
-        return response.text
+        return fetch_text(url)
     
     except requests.exceptions.RequestException as e:
         print(f"Error fetching URL {url}: {e}")
         return None
     
+# Markers that delimit the sections of a case page. They are all located in
+# a single scan and every extractor slices its section from that index.
+CASE_SECTION_MARKERS = [
+    "Would you like to associate an Article to this Case",
+    "Environment",
+    "Description",
+    "Severity",
+    "Emails",
+    "Open Activities",
+    "Case Comments",
+    "Case Feed",
+    "Related Articles",
+    "Bug/Enh CCR",
+]
+
+TD_OPEN = re.compile(r'<td\b', re.IGNORECASE)
+TD_CLOSE = re.compile(r'</td\s*>', re.IGNORECASE)
+
+
+def locate_sections(html_content, markers=CASE_SECTION_MARKERS):
+    # One regex pass over the page, recording every occurrence of every marker
+    pattern = re.compile("|".join(re.escape(m) for m in sorted(markers, key=len, reverse=True)))
+    positions = {marker: [] for marker in markers}
+    for match in pattern.finditer(html_content):
+        positions[match.group(0)].append(match.start())
+    return positions
+
+
+class CasePage:
+    """Raw page html plus its section index; each section is parsed at most once."""
+
+    def __init__(self, html_content, markers=CASE_SECTION_MARKERS):
+        self.html = html_content
+        self.positions = locate_sections(html_content, markers)
+        self._soups = {}
+
+    def find(self, marker, start=0):
+        # Same result as html.find(marker, start), answered from the index
+        occurrences = self.positions.get(marker)
+        if occurrences is None:
+            return self.html.find(marker, start)
+        i = bisect_left(occurrences, start)
+        return occurrences[i] if i < len(occurrences) else -1
+
+    def soup(self, start=0, end=None):
+        if end is None or end == -1:
+            end = len(self.html)
+        key = (start, end)
+        if key not in self._soups:
+            with timed('parse'):
+                self._soups[key] = make_soup(self.html[start:end])
+        return self._soups[key]
+
+    def text(self, *cuts):
+        # get_text() of the whole page from the soups of the slices between the
+        # cuts, so a section an extractor already parsed is not parsed again
+        cuts = [cut for cut in cuts if cut != -1]
+        if cuts != sorted(cuts):
+            cuts = []
+        bounds = [0, *cuts, len(self.html)]
+        return "".join(self.soup(start, end).get_text() for start, end in zip(bounds, bounds[1:]) if start < end)
+
+
+def as_page(html_content):
+    if isinstance(html_content, CasePage):
+        return html_content
+    return CasePage(html_content)
+
+
+@instrument('extract_description')
 def extract_description(html_content):
-  
-    start = "Description"
-    position = html_content.find(start)
-    if position != -1:
-        new_content = html_content[position:]
-    end = "Severity"
-    position = new_content.find(end)
-    if position != -1:
-        new_content2 = new_content[:position]
-    soup_desc = BeautifulSoup(new_content2, 'html.parser')
+    page = as_page(html_content)
+    start = page.find("Description")
+    if start == -1:
+        return ""
+    end = page.find("Severity", start)
+    soup_desc = page.soup(start, end)
     desc = soup_desc.get_text()[12:]
     return desc
 
+@instrument('header_extractor')
 def header_extractor(html_content):
     try:
-        
-        start_marker = "Emails"
-        end_marker = "Open Activities"
-            
-        start_pos = html_content.find(start_marker)
-        end_pos = html_content.find(end_marker)
+        page = as_page(html_content)
+        start_pos = page.find("Emails")
+        end_pos = page.find("Open Activities")
 
         if start_pos == -1 or end_pos == -1:
             
             return "Start or end marker not found in the HTML content"
 
-        new_content = html_content[start_pos:end_pos]
-        soup = BeautifulSoup(new_content, 'html.parser')
+        soup = page.soup(start_pos, end_pos)
         rows = soup.find_all('tr')
-        specific_widths = ["10%", "10%", "40%", "30%", "10%"]
         headers = []
         for row in rows:
             tds = row.find_all('td')
-            if len(tds) == 5:
-                widths = []
-                for td in tds:
-                    style = td.get('style', '')
-                    width = ''
-                    for part in style.split(';'):
-                        if 'width:' in part:
-                            width = part.split('width:')[1].strip()
-                    widths.append(width)
-                
-                if widths == specific_widths:
-                    td_texts = [td.get_text(strip=True) for td in tds]
-                    headers.append(td_texts)
+            # Widths come from case_schema; parsed styles are memoized across pages
+            if CASE_MATCHERS.is_email_header(tds):
+                td_texts = [td.get_text(strip=True) for td in tds]
+                headers.append(td_texts)
         
         return headers
 
     except Exception as e:
-        print(f"Exception in cleanup_emails for case {case_no}: {e}")
-        return f"Exception in cleanup_emails for case {case_no}: {e}"
+        print(f"Exception in header_extractor: {e}")
+        return f"Exception in header_extractor: {e}"
     
 
+@instrument('dedup_emails')
 def cleanup_emails(html_content):
     seen_hashes = set()
     cleaned_emails = []
     
     try:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        raw_text = soup.get_text()
+        page = as_page(html_content)
+        # The Emails section comes from the soup header_extractor parsed
+        raw_text = page.text(page.find("Emails"), page.find("Open Activities"))
         
         # Normalize content: Remove image references, timestamps, and URLs
         normalized_text = re.sub(r'\[cid:.*?\]', '', raw_text)              # Remove [cid:...]
@@ -123,20 +189,18 @@ def cleanup_emails(html_content):
         print(f"Error: {e}")
         return []
 
+@instrument('extract_comments')
 def extract_comments(html_content):
 
-    start = "Case Feed"
-    position = html_content.find(start)
-    if position != -1:
-        new_content = html_content[position:]
+    page = as_page(html_content)
+    start = page.find("Case Feed")
+    element_comment = []
+    if start == -1:
+        return element_comment
 
-    end = "Related Articles"
-    position = new_content.find(end)
-    if position != -1:
-        new_content2 = new_content[:position]
-    soup = BeautifulSoup(new_content2, 'html.parser')
+    end = page.find("Related Articles", start)
+    soup = page.soup(start, end)
     target_table = soup.find('table')
-    element_comment = []
 
 
     if target_table is not None:
@@ -153,19 +217,17 @@ def extract_comments(html_content):
   
 
 
+@instrument('get_jira_comments')
 def get_jira_comments(html_content):
     
-    start = "Case Comments"
-    position = html_content.find(start)
-    if position != -1:
-        new_content = html_content[position:]
-    end = "Case Feed"
-    position = new_content.find(end)
-    if position != -1:
-        new_content2 = new_content[:position]
-    soup = BeautifulSoup(new_content2, 'html.parser')
-    target_table = soup.find('table')
+    page = as_page(html_content)
+    start = page.find("Case Comments")
     jira_comments = []
+    if start == -1:
+        return jira_comments
+    end = page.find("Case Feed", start)
+    soup = page.soup(start, end)
+    target_table = soup.find('table')
     if target_table is None:
         return jira_comments
     else:
@@ -176,16 +238,24 @@ def get_jira_comments(html_content):
     return jira_comments
  
 
+@instrument('check_ccr')
 def check_ccr(html_content):
     
-    start="Bug/Enh CCR"
-    position=html_content.find(start)
-    if position!=-1:
-        new_content=html_content[position:]
-    soup=BeautifulSoup(new_content,'html.parser')
-    element=soup.find('td')
+    page = as_page(html_content)
+    start = page.find("Bug/Enh CCR")
+    if start == -1:
+        return "No ccr."
+    # Only the first cell after the marker is read, so stop parsing once it closes
+    end = -1
+    td_open = TD_OPEN.search(page.html, start)
+    if td_open:
+        td_close = TD_CLOSE.search(page.html, td_open.end())
+        if td_close:
+            end = td_close.end()
+    soup = page.soup(start, end)
+    element = soup.find('td')
    
-    if len((element.get_text()).strip())!=0:
+    if element is not None and len((element.get_text()).strip())!=0:
         ccr_no=(element.get_text()).strip()
     else:
         ccr_no="No ccr."
@@ -193,52 +263,54 @@ def check_ccr(html_content):
     return ccr_no
 
 
+@instrument('case_title')
 def case_title(html_content):
-    start = "Would you like to associate an Article to this Case"
-    position = html_content.find(start)
-    if position != -1:
-        new_content = html_content[position+51:]
-    end = "Environment"
-    position = new_content.find(end)
-    if position != -1:
-        new_content2 = new_content[:position]
-        soup = BeautifulSoup(new_content2, 'html.parser')
-        text = soup.get_text(strip=True)[19:]
+    page = as_page(html_content)
+    start = page.find("Would you like to associate an Article to this Case")
+    if start == -1:
+        return ""
+    end = page.find("Environment", start + 51)
+    if end == -1:
+        return ""
+    soup = page.soup(start + 51, end)
+    text = soup.get_text(strip=True)[19:]
 
     
     return(text)
 
 
+CCR_SECTION_MARKERS = ["DESCRIPTION", "NOTES", "AUDIT TRAIL"]
+
+
+def fetch_ccr_page(ccr_no):
+    # Error statuses raise, so ccr_pages never stores an error page
+    return fetch_text(generate_url(ccr_no))
+
+# Shared by every request in the process, so a CCR page is downloaded once
+# per TTL no matter how many cases point at it
+ccr_pages = CCRPageCache(fetch_ccr_page, max_entries=256, ttl=600)
+
+
 #following functions are only printed if ccr_no exists
-def extract_ccr_desc(url):
-    response=requests.get(url)
-    html_content=response.text
-    start = "DESCRIPTION"
-    position = html_content.find(start)
-    if position != -1:
-        new_content = html_content[position:]
-
-    end = "NOTES"
-    position = new_content.find(end)
-    if position != -1:
-        new_content2 = new_content[:position]
-    soup_desc = BeautifulSoup(new_content2, 'html.parser')
+@instrument('extract_ccr_desc')
+def extract_ccr_desc(html_content):
+    page = html_content if isinstance(html_content, CasePage) else CasePage(html_content, CCR_SECTION_MARKERS)
+    start = page.find("DESCRIPTION")
+    if start == -1:
+        return ""
+    end = page.find("NOTES", start)
+    soup_desc = page.soup(start, end)
     desc = soup_desc.get_text()[12:]
     return desc
 
-def extract_notes(url):
-    response=requests.get(url)
-    html_content=response.text
-    start = "NOTES"
-    position = html_content.find(start)
-    if position != -1:
-        new_content = html_content[position:]
-
-    end = "AUDIT TRAIL" #change this till audit trail
-    position = new_content.find(end)
-    if position != -1:
-        new_content2 = new_content[:position]
-    soup_notes = BeautifulSoup(new_content2, 'html.parser')
+@instrument('extract_notes')
+def extract_notes(html_content):
+    page = html_content if isinstance(html_content, CasePage) else CasePage(html_content, CCR_SECTION_MARKERS)
+    start = page.find("NOTES")
+    if start == -1:
+        return []
+    end = page.find("AUDIT TRAIL", start) #change this till audit trail
+    soup_notes = page.soup(start, end)
     notes = soup_notes.get_text()
     indices = []
     start = 0
@@ -261,29 +333,20 @@ def extract_notes(url):
     return L
 
 
-def parse_date(date_str):
-    formats = ['%m/%d/%Y, %H:%M:%S','%d/%m/%Y, %H:%M:%S', '%d/%m/%Y %H:%M', '%Y/%d/%m %H:%M', '%Y-%m-%d %H:%M:%S',
-               '%A, %d %B %Y at %I:%M %p', '%A, %d %B %Y at %H:%M', '%d %B %Y %H:%M:%S']
-    for fmt in formats:
-        try:
-            return datetime.strptime(date_str, fmt)
-        except ValueError:
-            pass
-    return None
+def parse_date(date_str, source=None):
+    # source names where the string came from, so its format is tried first
+    return DATE_PARSER.parse(date_str, source)
 #just these 2
 
 
-def gen_string(case_no):
-    try:
-        generated_url = generate_url(case_no)
-        html_content = fetch_url_content(generated_url)
-        
-        if not html_content:
-            return "Error fetching content from URL."
+FETCH_ERROR = "Error fetching content from URL."
 
-        case_title1 = case_title(html_content)
-        
-        case_thread = """
+
+@instrument('render_case_info')
+def render_case_info(case_no, page):
+    case_title1 = case_title(page)
+    
+    case_thread = """
         <style>
         @import url('https://fonts.googleapis.com/css2?family=Rubik:ital,wght@0,300..900;1,300..900&display=swap');
         
@@ -348,12 +411,12 @@ def gen_string(case_no):
         }
         </style>
         """
-        desc = extract_description(html_content)
-        case_thread += f"""
+    desc = extract_description(page)
+    case_thread += f"""
             <h3>Case Information:</h3>
             <div class="section">
                 
-                <p><b>Case Number:</b> <a href="http://cdsinfo.cadence.com/cgi-bin/cdsinfoprod?input={case_no}&type=_&codmode=p" target = "_blank">{case_no}</a></p>
+                <p><b>Case Number:</b> <a href="http://cdsinfo.cadence.com/cgi-bin/cdsinfoprod?input={escape(str(case_no))}&type=_&codmode=p" target = "_blank">{escape(str(case_no))}</a></p>
                 <p><b>Case Title:</b></p>
                 <div class="description">{case_title1}</div>
                 <p><b>Case Decription:</b></p>
@@ -361,19 +424,13 @@ def gen_string(case_no):
             </div>
             
             """
+    return case_thread
 
-        paired_with_dates = []
-
-        headers = header_extractor(html_content)
-        emails = cleanup_emails(html_content)
-        #print(emails)
 
-        ccr_no = check_ccr(html_content)
-        
-        if ccr_no != "No ccr.":
-            ccr_url = generate_url(int(ccr_no))
-            ccr_desc = extract_ccr_desc(ccr_url)
-            case_thread += f"""
+@instrument('render_ccr_info')
+def render_ccr_info(ccr_no, ccr_page):
+    ccr_desc = extract_ccr_desc(ccr_page)
+    return f"""
             <div class="section">
                 <h2>CCR Information</h2>
                 <p><b>CCR Number:</b> <a href="http://cdsinfo.cadence.com/cgi-bin/cdsinfoprod?input={ccr_no}&type=_&codmode=p" target = "_blank">{ccr_no}</a></p>
@@ -381,104 +438,439 @@ def gen_string(case_no):
                 <div class="description">{ccr_desc}</div>
             </div>
             """
-            L = extract_notes(ccr_url)
-            for i in range(len(L)):
-                start = L[i].find("On:")
-                end = L[i].find("====")
-                d = L[i][start+4:end-1]
-                start2 = L[i].find("by:")
-                end2 = L[i].find("On:")
-                sender = L[i][start2+4:end2-1]
-                d_obj = parse_date(d)
-                if d_obj:
-                    paired_with_dates.append([d_obj, "CCR-NOTE", sender, "-", d, L[i]])
-        
-        
 
-        emails = iter(emails)
-        for header in headers[1:]:
-            date = header[4]
-            d_obj = parse_date(date)
-            email_body = next(emails, None)
-            paired_with_dates.append([d_obj, header[0], header[3], header[2], header[4], email_body])
-        
-        element_comment = extract_comments(html_content)
-        comments = [element_comment[i:i + 3] for i in range(0, len(element_comment), 3)]
-        for comment in comments:
-            try:
-                d_obj = parse_date(comment[2])
-                if d_obj:
-                    paired_with_dates.append([d_obj, "COMMENT", comment[1], "-", comment[2], comment[0]])
-            except IndexError:
-                pass
-
-        jira_comments = get_jira_comments(html_content)
-        if len(jira_comments) == 0:
-            jira_comments.append("No jira comments.")
-        
-        if jira_comments[0] != "No jira comments.":
-            for i in range(len(jira_comments)):
-                k = jira_comments[i].find("(")
-                d = jira_comments[i][k+1:k+21]
-                s = jira_comments[i].find("Created By:")
-                sender = jira_comments[i][s+12:s+31]
-                d_obj = parse_date(d)
-                paired_with_dates.append([d_obj, "Jira comment", sender, "-", d, jira_comments[i]])
 
+def ccr_timeline(ccr_page):
+    paired_with_dates = []
+    L = extract_notes(ccr_page)
+    for i in range(len(L)):
+        start = L[i].find("On:")
+        end = L[i].find("====")
+        d = L[i][start+4:end-1]
+        start2 = L[i].find("by:")
+        end2 = L[i].find("On:")
+        sender = L[i][start2+4:end2-1]
+        d_obj = parse_date(d, 'ccr_note')
+        if d_obj:
+            paired_with_dates.append([d_obj, "CCR-NOTE", sender, "-", d, L[i]])
+    return paired_with_dates
+
+
+def case_timeline(page):
+    paired_with_dates = []
+    headers = header_extractor(page)
+    emails = cleanup_emails(page)
+
+    emails = iter(emails)
+    for header in headers[1:]:
+        date = header[4]
+        d_obj = parse_date(date, 'email')
+        email_body = next(emails, None)
+        paired_with_dates.append([d_obj, header[0], header[3], header[2], header[4], email_body])
+    
+    element_comment = extract_comments(page)
+    comments = [element_comment[i:i + 3] for i in range(0, len(element_comment), 3)]
+    for comment in comments:
+        try:
+            d_obj = parse_date(comment[2], 'case_feed')
+            if d_obj:
+                paired_with_dates.append([d_obj, "COMMENT", comment[1], "-", comment[2], comment[0]])
+        except IndexError:
+            pass
+
+    jira_comments = get_jira_comments(page)
+    if len(jira_comments) == 0:
+        jira_comments.append("No jira comments.")
+    
+    if jira_comments[0] != "No jira comments.":
+        for i in range(len(jira_comments)):
+            k = jira_comments[i].find("(")
+            d = jira_comments[i][k+1:k+21]
+            s = jira_comments[i].find("Created By:")
+            sender = jira_comments[i][s+12:s+31]
+            d_obj = parse_date(d, 'jira')
+            paired_with_dates.append([d_obj, "Jira comment", sender, "-", d, jira_comments[i]])
+    return paired_with_dates
+
+
+def iter_timeline(paired_with_dates):
+    with timed('timeline_sort'):
         sorted_paired_with_dates = sorted(paired_with_dates, key=lambda x: x[0])
-        case_thread+=f"<b>COMMUNICATIONS:</b><br><br>"
-        html_table = "<table id='customers'>"
-        html_table += "<tr><th>TYPE</th><th>SENDER</th><th>SUBJECT</th><th>DATE</th><th>NO. OF DAYS</th></tr>"
-        for i in range(len(sorted_paired_with_dates)):
-            if i != 0:
-                start = sorted_paired_with_dates[i-1][0]
-                end = sorted_paired_with_dates[i][0]
-                diff = np.busday_count(start.date(), end.date())
-                html_table += f"<tr><td>{sorted_paired_with_dates[i][1]}</td><td>{sorted_paired_with_dates[i][2]}</td><td>{sorted_paired_with_dates[i][3]}</td><td>{sorted_paired_with_dates[i][4]}</td><td>{diff}</td><tr border='0'><td colspan='5'>{sorted_paired_with_dates[i][5]}</td></tr></tr>"
-            else:
-                html_table += f"<tr><td>{sorted_paired_with_dates[i][1]}</td><td>{sorted_paired_with_dates[i][2]}</td><td>{sorted_paired_with_dates[i][3]}</td><td>{sorted_paired_with_dates[i][4]}</td><td>Initial Mail</td><tr border='0'><td colspan='5'>{sorted_paired_with_dates[i][5]}</td></tr></tr>"
-        
-        html_table += "</table>"
-        case_thread += html_table
+        # Business days between consecutive rows, for the whole timeline at once
+        gaps = business_day_gaps([row[0] for row in sorted_paired_with_dates])
+    yield "<b>COMMUNICATIONS:</b><br><br>"
+    yield "<table id='customers'>"
+    yield "<tr><th>TYPE</th><th>SENDER</th><th>SUBJECT</th><th>DATE</th><th>NO. OF DAYS</th></tr>"
+    for i in range(len(sorted_paired_with_dates)):
+        if i != 0:
+            diff = gaps[i-1]
+            yield f"<tr><td>{sorted_paired_with_dates[i][1]}</td><td>{sorted_paired_with_dates[i][2]}</td><td>{sorted_paired_with_dates[i][3]}</td><td>{sorted_paired_with_dates[i][4]}</td><td>{diff}</td><tr border='0'><td colspan='5'>{sorted_paired_with_dates[i][5]}</td></tr></tr>"
+        else:
+            yield f"<tr><td>{sorted_paired_with_dates[i][1]}</td><td>{sorted_paired_with_dates[i][2]}</td><td>{sorted_paired_with_dates[i][3]}</td><td>{sorted_paired_with_dates[i][4]}</td><td>Initial Mail</td><tr border='0'><td colspan='5'>{sorted_paired_with_dates[i][5]}</td></tr></tr>"
+    
+    yield "</table>"
+
+
+def iter_report(case_no):
+    # Yields the report in chunks: case information first, then the CCR
+    # section, then one chunk per timeline row. Exceptions propagate.
+    generated_url = generate_url(case_no)
+    with timed('fetch'):
+        html_content = fetch_url_content(generated_url)
+
+    if not html_content:
+        yield FETCH_ERROR
+        return
 
-        return case_thread
+    yield from iter_page_report(case_no, html_content)
+
+
+def iter_page_report(case_no, html_content):
+    # The report for a page that is already fetched
+    page = CasePage(html_content)
+    yield render_case_info(case_no, page)
+
+    paired_with_dates = []
+    ccr_no = check_ccr(page)
+    if ccr_no != "No ccr.":
+        ccr_page = CasePage(ccr_pages.get(int(ccr_no)), CCR_SECTION_MARKERS)
+        yield render_ccr_info(ccr_no, ccr_page)
+        paired_with_dates += ccr_timeline(ccr_page)
+    paired_with_dates += case_timeline(page)
+
+    yield from iter_timeline(paired_with_dates)
+
+
+def gen_string(case_no):
+    try:
+        with timed('report'):
+            return "".join(iter_report(case_no))
 
     except Exception as e:
         print(f"Exception in gen_string for case {case_no}: {e}")
-        return f"Exception in gen_string for case {case_no}: {e}"
+        return escape(f"Exception in gen_string for case {case_no}: {e}")
 
 
-def index1(environ):
-    body = environ['QUERY_STRING']
+def stream_report(case_no, chunks=None):
+    # Like gen_string, but chunks are sent as they are rendered, so an error
+    # can only be appended after whatever was already sent
+    try:
+        yield from chunks if chunks is not None else iter_report(case_no)
+
+    except Exception as e:
+        print(f"Exception in stream_report for case {case_no}: {e}")
+        yield escape(f"Exception in gen_string for case {case_no}: {e}")
+
+
+def case_from_query(body):
+    # Case number from the first query argument, or None without a query
+    if body:
+        args = body.replace("%20", " ")
+        args = args.replace("%27", "'")
+        for arg in args.split("&"):
+            key = arg.split("=")[0]
+            val = arg.split("=")[1]
+            return val
+    return None
+
+MAX_BATCH_CASES = 50
+BATCH_WORKERS = 8
+CASE_NUMBER = re.compile(r'[0-9]+')
+
+
+def batch_from_query(body):
+    # (case numbers, layout) for ?cases=1,2,3 or repeated ?case=..., else None
+    params = parse_qsl(body or '')
+    keys = [key for key, _ in params]
+    cases = []
+    for key, val in params:
+        if key in ('case', 'cases'):
+            cases += [c.strip() for c in val.split(',') if c.strip()]
+    if 'cases' not in keys and len(cases) < 2:
+        return None
+    layout = dict(params).get('layout', 'sections')
+    return cases[:MAX_BATCH_CASES], layout
+
+
+def collect_case(case_no):
+    # Header sections and timeline rows of one case, for reports that merge cases
+    html_content = fetch_url_content(generate_url(case_no))
+    if not html_content:
+        raise ValueError(FETCH_ERROR)
+    page = CasePage(html_content)
+    sections = [render_case_info(case_no, page)]
+    paired_with_dates = []
+    ccr_no = check_ccr(page)
+    if ccr_no != "No ccr.":
+        ccr_page = CasePage(ccr_pages.get(int(ccr_no)), CCR_SECTION_MARKERS)
+        sections.append(render_ccr_info(ccr_no, ccr_page))
+        paired_with_dates += ccr_timeline(ccr_page)
+    paired_with_dates += case_timeline(page)
+    return sections, paired_with_dates
+
+
+def cached_report(case_no):
+    # Full report text through report_cache; errors propagate
+    report, claim = report_cache.acquire(case_no)
+    if report is not None:
+        return report.body.decode('utf-8')
+    chunks = report_cache.build(case_no, claim) if claim is not None else iter_report(case_no)
+    report = "".join(chunks)
+    if report == FETCH_ERROR:
+        raise ValueError(FETCH_ERROR)
+    return report
+
+
+def case_error_section(case_no, error):
+    print(f"Exception in batch report for case {case_no}: {error}")
+    return f"""
+            <div class="section">
+                <h2>Case {escape(case_no)}</h2>
+                <p><b>Error:</b> {escape(str(error))}</p>
+            </div>
+            """
+
+
+def batch_report(case_numbers, layout='sections'):
+    # Reports for many cases built in parallel. A failing case becomes an
+    # error section instead of failing the whole page.
+    # layout='sections': each case's full report in its own section.
+    # layout='combined': all case sections, then one timeline over every case.
+    # Case numbers come from the query string and are only fetched when all digits
+    build = collect_case if layout == 'combined' else cached_report
+    results = []
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        futures = [pool.submit(build, case_no) if CASE_NUMBER.fullmatch(case_no) else None
+                   for case_no in case_numbers]
+        for case_no, future in zip(case_numbers, futures):
+            if future is None:
+                results.append((case_no, None, ValueError("Invalid case number")))
+                continue
+            try:
+                results.append((case_no, future.result(), None))
+            except Exception as e:
+                results.append((case_no, None, e))
+
+    if layout != 'combined':
+        parts = []
+        for case_no, report, error in results:
+            if error is not None:
+                parts.append(case_error_section(case_no, error))
+            else:
+                parts.append(f'<div class="section" id="case-{case_no}">{report}</div>')
+        return "".join(parts)
+
+    parts = []
+    paired_with_dates = []
+    for case_no, collected, error in results:
+        if error is not None:
+            parts.append(case_error_section(case_no, error))
+            continue
+        sections, rows = collected
+        parts += sections
+        for row in rows:
+            paired_with_dates.append([row[0], f"{case_no} {row[1]}"] + row[2:])
+    parts += iter_timeline(paired_with_dates)
+    return "".join(parts)
+
 
+def index1(environ):
     try:
-        if body:
-            args = body.replace("%20", " ")
-            args = args.replace("%27", "'")
-            for arg in args.split("&"):
-                key = arg.split("=")[0]
-                val = arg.split("=")[1]
-                case_thread = gen_string(val)
-                return case_thread
+        batch = batch_from_query(environ['QUERY_STRING'])
+        if batch is not None:
+            return batch_report(*batch)
+        case_no = case_from_query(environ['QUERY_STRING'])
+        if case_no is not None:
+            case_thread = gen_string(case_no)
+            return case_thread
     except Exception as e:
         print('Exception:' + str(e))
         return "Error processing request."
 
     return ""
 
+# Rendered reports, reused for REPORT_TTL seconds; pass refresh=1 in the
+# query or call report_cache.invalidate(case_no) to force a rebuild
+REPORT_TTL = 120
+report_cache = ReportCache(iter_report, ttl=REPORT_TTL, cacheable=lambda body: body != FETCH_ERROR)
+register_cache('ccr_pages', ccr_pages)
+register_cache('reports', report_cache)
+METRICS_PATH = '/metrics'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
 def application(environ, start_response):
-    status = '200 OK'
-    output = index1(environ).encode('utf-8')
+    if environ.get('PATH_INFO') == METRICS_PATH:
+        output = render_prometheus().encode('utf-8')
+        start_response('200 OK', [('Content-type', METRICS_CONTENT_TYPE),
+                                  ('Content-Length', str(len(output)))])
+        return [output]
 
+    # Clients may keep the page but must revalidate it with the ETag every time
     response_headers = [('Content-type', 'text/html'),
-                        ('Content-Length', str(len(output))),
-                        ('Cache-Control', 'no-cache, no-store, must-revalidate'),
-                        ('Pragma', 'no-cache'),
-                        ('Expires', '0')]
+                        ('Cache-Control', 'no-cache')]
 
-    start_response(status, response_headers)
+    query = environ.get('QUERY_STRING', '')
+    try:
+        batch = batch_from_query(query)
+        if batch is not None:
+            output = batch_report(*batch).encode('utf-8')
+            start_response('200 OK', response_headers + [('Content-Length', str(len(output)))])
+            return [output]
+        case_no = case_from_query(query)
+    except Exception as e:
+        print('Exception:' + str(e))
+        start_response('200 OK', response_headers)
+        return [b"Error processing request."]
+    if case_no is None:
+        start_response('200 OK', response_headers)
+        return [b""]
+
+    if 'refresh=1' in query.split('&'):
+        report_cache.invalidate(case_no)
+
+    report, claim = report_cache.acquire(case_no)
+    if report is not None:
+        if report.etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', [('ETag', report.etag), ('Cache-Control', 'no-cache')])
+            return []
+        start_response('200 OK', response_headers + [('ETag', report.etag),
+                                                     ('Content-Length', str(len(report.body)))])
+        return [report.body]
+
+    # Not cached: stream while rendering (no Content-Length); the render runs
+    # ahead of a slow client, and the finished report is stored for the next request
+    if claim is None:
+        start_response('200 OK', response_headers)
+        return (chunk.encode('utf-8') for chunk in stream_report(case_no))
+    chunks = report_cache.build(case_no, claim)
+    # The server closes the body even when it never iterates it, which releases the build
+    body = BuildBody((chunk.encode('utf-8') for chunk in stream_report(case_no, chunks)), chunks.close)
+    try:
+        start_response('200 OK', response_headers)
+    except BaseException:
+        body.close()
+        raise
+    return body
+
+# CCR fetches in flight, per event loop, shared by every request waiting for the same page
+_ccr_fetches = {}
+
+
+async def fetch_ccr_page_async(ccr_no):
+    cached = ccr_pages.peek(ccr_no)
+    if cached is not None:
+        return cached
+    loop = asyncio.get_running_loop()
+    key = (loop, str(ccr_no).strip())
+    fetch = _ccr_fetches.get(key)
+    if fetch is None:
+        fetch = loop.create_task(_fetch_ccr_page_async(ccr_no))
+        _ccr_fetches[key] = fetch
+        fetch.add_done_callback(lambda task: _ccr_fetch_done(key, task))
+    # A request that is cancelled stops waiting without cancelling the shared fetch
+    return await asyncio.shield(fetch)
+
+
+async def _fetch_ccr_page_async(ccr_no):
+    # Error statuses raise, so ccr_pages never stores an error page
+    html_content = await fetch_text_async(generate_url(ccr_no))
+    ccr_pages.put(ccr_no, html_content)
+    return html_content
+
+
+def _ccr_fetch_done(key, task):
+    del _ccr_fetches[key]
+    if not task.cancelled():
+        task.exception()  # retrieved here in case every waiter was cancelled
+
+
+async def iter_report_async(case_no, executor=None):
+    # Same chunks as iter_report. Upstream fetches do not block the event loop,
+    # the CCR page downloads while the case page is parsed, and the parsing
+    # runs on the executor.
+    loop = asyncio.get_running_loop()
+    try:
+        html_content = await fetch_text_async(generate_url(case_no))
+    except Exception as e:
+        print(f"Error fetching URL for case {case_no}: {e}")
+        html_content = None
+    if not html_content:
+        yield FETCH_ERROR
+        return
+
+    page = await loop.run_in_executor(executor, CasePage, html_content)
+    ccr_no = await loop.run_in_executor(executor, check_ccr, page)
+    ccr_fetch = None
+    if ccr_no != "No ccr.":
+        ccr_fetch = asyncio.ensure_future(fetch_ccr_page_async(int(ccr_no)))
 
-    return [output]
+    try:
+        yield await loop.run_in_executor(executor, render_case_info, case_no, page)
+        case_rows = loop.run_in_executor(executor, case_timeline, page)
+
+        paired_with_dates = []
+        if ccr_fetch is not None:
+            ccr_page = CasePage(await ccr_fetch, CCR_SECTION_MARKERS)
+            yield await loop.run_in_executor(executor, render_ccr_info, ccr_no, ccr_page)
+            paired_with_dates += await loop.run_in_executor(executor, ccr_timeline, ccr_page)
+        paired_with_dates += await case_rows
+    finally:
+        if ccr_fetch is not None and not ccr_fetch.done():
+            ccr_fetch.cancel()
+
+    for chunk in await loop.run_in_executor(executor, lambda: list(iter_timeline(paired_with_dates))):
+        yield chunk
+
+
+async def asgi_application(scope, receive, send):
+    # ASGI counterpart of application, e.g. `uvicorn Gaurav_CMP:asgi_application`
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    if scope.get('path') == METRICS_PATH:
+        output = render_prometheus().encode('utf-8')
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', METRICS_CONTENT_TYPE.encode('latin-1'))]})
+        await send({'type': 'http.response.body', 'body': output})
+        return
+
+    response_headers = [(b'content-type', b'text/html'),
+                        (b'cache-control', b'no-cache')]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+
+    query = scope.get('query_string', b'').decode('latin-1')
+    try:
+        case_no = None
+        batch = batch_from_query(query)
+        if batch is not None:
+            # batch_report builds the cases on its own thread pool
+            output = await asyncio.get_running_loop().run_in_executor(None, batch_report, *batch)
+            await send({'type': 'http.response.body', 'body': output.encode('utf-8'), 'more_body': True})
+        else:
+            case_no = case_from_query(query)
+    except Exception as e:
+        print('Exception:' + str(e))
+        case_no = None
+        await send({'type': 'http.response.body', 'body': b"Error processing request.", 'more_body': True})
+
+    if case_no is not None:
+        try:
+            async for chunk in iter_report_async(case_no):
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+        except Exception as e:
+            print(f"Exception in asgi_application for case {case_no}: {e}")
+            message = escape(f"Exception in gen_string for case {case_no}: {e}")
+            await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+
+    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
 
 def index_local(id):
     try:
@@ -504,22 +896,30 @@ def index_local(id):
     except Exception as e:
         return f"Error: {str(e)}"
     
-a= index_local('46816635')
-print(a)
 
-soup = BeautifulSoup(a, 'html.parser')
+def main():
+    # Renders one case locally and saves its text to output.txt
+    a= index_local('46816635')
+    print(a)
+
+    soup = make_soup(a)
+
+    a = soup.get_text() # Extract text content without HTML tags
+    # a = soup.prettify()
+
 
-a = soup.get_text() # Extract text content without HTML tags
-# a = soup.prettify()
+    # Save 'a' output to a text file
+    # with open('output.txt', 'w') as f:
+    #     f.write(a)
 
 
-# Save 'a' output to a text file
-# with open('output.txt', 'w') as f:
-#     f.write(a)
+    # Create a DataFrame with the HTML content
+    import pandas as pd  # only this script path needs pandas
+    df = pd.DataFrame([a], columns=["HTML_Content"])
 
+    # Save the DataFrame to a text file
+    df.to_csv('output.txt', index=False, header=False)
 
-# Create a DataFrame with the HTML content
-df = pd.DataFrame([a], columns=["HTML_Content"])
 
-# Save the DataFrame to a text file
-df.to_csv('output.txt', index=False, header=False)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
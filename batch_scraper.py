@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+class CaseResult:
+    def __init__(self, case_no, url, rows=None, error=None, elapsed=0.0):
+        self.case_no = case_no
+        self.url = url
+        self.rows = rows if rows is not None else []
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"CaseResult({self.case_no!r}, rows={len(self.rows)}, {status})"
+
+
+class HostLimiter:
+    # One semaphore per upstream host so a batch never floods a single server
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def scrape_case(case_no, generate_url, fetch, parse, limiter=None):
+    url = generate_url(case_no)
+    started = time.perf_counter()
+    try:
+        if limiter is not None:
+            with limiter(url):
+                html_content = fetch(url)
+        else:
+            html_content = fetch(url)
+        if not html_content:
+            return CaseResult(case_no, url, error="fetch failed", elapsed=time.perf_counter() - started)
+        rows = parse(html_content)
+        return CaseResult(case_no, url, rows=rows, elapsed=time.perf_counter() - started)
+    except Exception as e:
+        return CaseResult(case_no, url, error=f"{type(e).__name__}: {e}", elapsed=time.perf_counter() - started)
+
+
+def iter_scrape_cases(case_numbers, generate_url, fetch, parse, workers=8, per_host=4):
+    """Fetch and parse cases concurrently, yielding a CaseResult per case in input order.
+
+    At most ``workers * 2`` cases are in flight, so results are consumed as
+    they complete instead of accumulating for the whole batch.
+    """
+    limiter = HostLimiter(per_host)
+    window = max(1, workers * 2)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for case_no in case_numbers:
+            in_flight.append(pool.submit(scrape_case, case_no, generate_url, fetch, parse, limiter))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def scrape_cases(case_numbers, generate_url, fetch, parse, workers=8, per_host=4):
+    return list(iter_scrape_cases(case_numbers, generate_url, fetch, parse, workers, per_host))
@@ -0,0 +1,171 @@
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import html_parsers
+from synthetic_pages import case_page, ccr_page
+
+# Page shapes to benchmark: keyword arguments for synthetic_pages.case_page
+PAGE_SIZES = {
+    'small': dict(emails=5, repeats=2, comments=5, jira_comments=2, body_words=60),
+    'medium': dict(emails=40, repeats=3, comments=30, jira_comments=10, body_words=150),
+    'large': dict(emails=200, repeats=3, comments=100, jira_comments=25, body_words=300),
+}
+EXTRACTORS = ['gen_string', 'testing33', 'testing22', 'testing_file', 'Deep_testing', 'stream_extract']
+BENCH_CCR_NO = 2999001
+# A web worker imports Gaurav_CMP on every fork or reload
+IMPORT_MODULE = 'Gaurav_CMP'
+IMPORT_BUDGET_MS = 300
+LAZY_MODULES = ['pandas', 'numpy', 'httpx']  # must not be loaded by the import
+
+
+def load_extractors(names=EXTRACTORS):
+    # name -> function(html_content); gen_string renders from the html instead of fetching
+    extractors = {}
+    for name in names:
+        if name == 'gen_string':
+            import Gaurav_CMP
+            Gaurav_CMP.ccr_pages.put(BENCH_CCR_NO, ccr_page())
+            extractors[name] = lambda html, m=Gaurav_CMP: "".join(m.iter_page_report('bench', html))
+        elif name == 'stream_extract':
+            from stream_extract import parse_case_stream
+            extractors[name] = parse_case_stream
+        else:
+            module = __import__(name)
+            extractors[name] = module.parse_case
+    return extractors
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_one(extract, html_content, iterations, warmup=2):
+    for _ in range(warmup):
+        extract(html_content)
+
+    latencies = []
+    gc.collect()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        extract(html_content)
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - started
+    latencies.sort()
+
+    # Peak memory is measured in a separate run; tracemalloc slows every allocation
+    gc.collect()
+    tracemalloc.start()
+    extract(html_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'pages_per_s': iterations / total,
+        'mb_per_s': iterations * len(html_content.encode('utf-8')) / total / 1e6,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_mb': peak / 1e6,
+    }
+
+
+def run_benchmarks(extractor_names=EXTRACTORS, sizes=tuple(PAGE_SIZES), iterations=20, ccr=True, seed=0,
+                   parsers=None):
+    extractors = load_extractors(extractor_names)
+    selected = html_parsers.PARSER
+    results = []
+    try:
+        for parser in parsers or [selected]:
+            html_parsers.set_parser(parser)
+            for size in sizes:
+                html_content = case_page(ccr_no=BENCH_CCR_NO if ccr else None, seed=seed, **PAGE_SIZES[size])
+                for name, extract in extractors.items():
+                    stats = run_one(extract, html_content, iterations)
+                    stats.update(extractor=name, size=size, parser=parser, page_kb=len(html_content) / 1000)
+                    results.append(stats)
+                    print_result(stats)
+    finally:
+        html_parsers.set_parser(selected)
+    return results
+
+
+def print_result(stats):
+    print(f"{stats['parser']:<12} {stats['size']:<7} {stats['page_kb']:>8.1f}kB  {stats['extractor']:<15} "
+          f"{stats['pages_per_s']:>8.1f} pages/s {stats['mb_per_s']:>7.2f} MB/s  "
+          f"p50 {stats['p50_ms']:>8.2f}ms  p90 {stats['p90_ms']:>8.2f}ms  p99 {stats['p99_ms']:>8.2f}ms  "
+          f"peak {stats['peak_mb']:>7.2f}MB")
+
+
+def cold_import(module=IMPORT_MODULE, budget_ms=IMPORT_BUDGET_MS, top=10):
+    # Imports the module in a fresh interpreter with -X importtime and
+    # returns True when it stays within the budget and leaves LAZY_MODULES unloaded
+    check = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    # Run from this directory so the import works wherever the benchmark is started
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', check],
+                               capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode:
+        print(completed.stderr)
+        return False
+
+    # importtime lines: "import time: self [us] | cumulative | imported package"
+    timings = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            name = fields[2].rstrip()
+            depth = (len(name) - len(name.lstrip()) - 1) // 2  # nesting is shown as indentation
+            timings.append((int(fields[1]), name.strip(), depth))
+        except (IndexError, ValueError):
+            continue  # the header line
+    # Children are listed before their parent, so the module's direct imports
+    # are the depth 1 lines since the previous top level import
+    total_ms, children = 0, []
+    for us, name, depth in timings:
+        if depth == 0:
+            if name == module:
+                total_ms = us / 1000
+                break
+            children = []
+        elif depth == 1:
+            children.append((us, name))
+    loaded = [name for name in completed.stdout.strip().split(',') if name]
+
+    print(f"import {module}: {total_ms:.1f}ms (budget {budget_ms}ms)")
+    for us, name in sorted(children, reverse=True)[:top]:
+        print(f"  {us / 1000:>8.1f}ms  {name}")
+    if loaded:
+        print(f"Loaded at import time: {', '.join(loaded)}")
+    return total_ms <= budget_ms and not loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the case page extractors on synthetic pages.")
+    parser.add_argument('--extractors', nargs='+', default=EXTRACTORS, choices=EXTRACTORS)
+    parser.add_argument('--sizes', nargs='+', default=list(PAGE_SIZES), choices=list(PAGE_SIZES))
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--no-ccr', action='store_true', help="pages without a CCR section")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--parsers', nargs='+', choices=html_parsers.BACKENDS,
+                        help="parser backends to compare (default: the selected one)")
+    parser.add_argument('--cold-import', action='store_true',
+                        help=f"time a fresh import of {IMPORT_MODULE} against its budget instead")
+    args = parser.parse_args()
+    if args.cold_import:
+        sys.exit(0 if cold_import() else 1)
+    run_benchmarks(args.extractors, args.sizes, args.iterations, ccr=not args.no_ccr, seed=args.seed,
+                   parsers=args.parsers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+
+from date_parsing import DATE_PARSER
+
+WEEKMASK = '1111100'  # Monday to Friday
+TIMELINE_COLUMNS = ['Business Days Since Previous', 'Case Turnaround Business Days']
+
+
+def load_holidays(path):
+    # One ISO date (YYYY-MM-DD) per line; blank lines and '#' comments are ignored
+    holidays = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                holidays.append(line)
+    return holidays
+
+
+def make_calendar(holidays=(), weekmask=WEEKMASK):
+    import numpy as np  # loaded on first use, not when the module is imported
+
+    return np.busdaycalendar(weekmask=weekmask, holidays=np.array(list(holidays), dtype='datetime64[D]'))
+
+
+# Built on first use; CMP_HOLIDAYS points at a holiday file for it
+DEFAULT_CALENDAR = None
+
+
+def default_calendar():
+    global DEFAULT_CALENDAR
+    if DEFAULT_CALENDAR is None:
+        DEFAULT_CALENDAR = make_calendar(load_holidays(os.environ['CMP_HOLIDAYS'])) \
+            if os.environ.get('CMP_HOLIDAYS') else make_calendar()
+    return DEFAULT_CALENDAR
+
+
+def set_default_holidays(holidays, weekmask=WEEKMASK):
+    global DEFAULT_CALENDAR
+    DEFAULT_CALENDAR = make_calendar(holidays, weekmask)
+
+
+def business_day_gaps(dates, calendar=None):
+    """Business days between each pair of consecutive dates, in one array call.
+
+    ``dates`` are datetimes or dates in timeline order; the result has one
+    entry fewer than ``dates``.
+    """
+    import numpy as np
+
+    if len(dates) < 2:
+        return np.zeros(0, dtype=np.int64)
+    days = np.array([d.date() if hasattr(d, 'date') else d for d in dates], dtype='datetime64[D]')
+    return np.busday_count(days[:-1], days[1:], busdaycal=calendar or default_calendar())
+
+
+def add_timeline_metrics(rows, date_columns=('Email Date',), calendar=None):
+    """Add TIMELINE_COLUMNS to one case's rows.
+
+    Each row's date is the first non-empty of ``date_columns``. Rows are
+    ordered by that date, and each row gets the business days since the row
+    before it, like the NO. OF DAYS column of the report. Every row also
+    gets the business days from the first to the last dated row. Rows whose
+    date does not parse get None for the gap.
+    """
+    import numpy as np
+
+    if not rows:
+        return rows
+    calendar = calendar or default_calendar()
+    raw_dates = []
+    for row in rows:
+        raw_dates.append(next((row[c] for c in date_columns if row.get(c)), None))
+    parsed = DATE_PARSER.parse_many(raw_dates).to_numpy(dtype='datetime64[D]')
+
+    dated = np.flatnonzero(~np.isnat(parsed))
+    gaps = {}
+    turnaround = None
+    if len(dated):
+        order = dated[np.argsort(parsed[dated], kind='stable')]
+        days = parsed[order]
+        deltas = np.busday_count(days[:-1], days[1:], busdaycal=calendar)
+        gaps = dict(zip(order[1:].tolist(), deltas.tolist()))
+        turnaround = int(np.busday_count(days[0], days[-1], busdaycal=calendar))
+
+    for i, row in enumerate(rows):
+        row['Business Days Since Previous'] = gaps.get(i)
+        row['Case Turnaround Business Days'] = turnaround
+    return rows
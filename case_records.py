@@ -0,0 +1,114 @@
+import hashlib
+
+EMAIL_COLUMNS = ('Email Name', 'Email Status', 'Email Subject', 'Email From', 'Email Date', 'Email Body')
+FEED_COLUMNS = ('Case Feed Author', 'Case Feed Comment', 'Case Feed Timestamp')
+# Marks where a case's label columns (product, contact, ...) go in a row layout
+DETAILS = None
+# Rows of testing33.parse_case and stream_extract.parse_case_stream, which must stay identical
+CASE_FEED_COLUMNS = ['Case Number', 'Case Title', 'Case Summary', *EMAIL_COLUMNS, *FEED_COLUMNS]
+
+
+def hash_content(fields):
+    # Fingerprint of an entry's fields; entries repeated on a page are kept once
+    combined = ' '.join(fields)
+    return hashlib.md5(combined.encode('utf-8')).hexdigest()
+
+
+class CaseRecord:
+    """Case level fields, stored once and shared by every email and feed entry of the case.
+
+    ``layout`` is the exporter's column order for flattened rows: column names
+    plus DETAILS where the ``details`` dict is spread in. As in a dict literal,
+    a column keeps its first position and takes its last value.
+    """
+
+    __slots__ = ('layout', 'number', 'title', 'environment', 'summary', 'details')
+    FIELDS = {'Case Number': 'number', 'Case Title': 'title', 'Environment': 'environment',
+              'Case Summary': 'summary'}
+
+    def __init__(self, layout, number, title, summary, environment='', details=None):
+        self.layout = layout
+        self.number = number
+        self.title = title
+        self.environment = environment
+        self.summary = summary
+        self.details = details or {}
+
+
+class EmailRecord:
+    __slots__ = ('case', 'name', 'status', 'subject', 'sender', 'date', 'body')
+    KIND = 'email'
+    FIELDS = dict(zip(EMAIL_COLUMNS, __slots__[1:]))
+
+    def __init__(self, case, name, status, subject, sender, date, body):
+        self.case = case
+        self.name = name
+        self.status = status
+        self.subject = subject
+        self.sender = sender
+        self.date = date
+        self.body = body
+
+
+class FeedRecord:
+    __slots__ = ('case', 'author', 'comment', 'timestamp')
+    KIND = 'feed'
+    FIELDS = dict(zip(FEED_COLUMNS, __slots__[1:]))
+
+    def __init__(self, case, author, comment, timestamp):
+        self.case = case
+        self.author = author
+        self.comment = comment
+        self.timestamp = timestamp
+
+
+ENTRY_TYPES = {cls.KIND: cls for cls in (EmailRecord, FeedRecord)}
+
+
+def as_row(record):
+    # The row dict the exporters used to build per entry; plain dicts pass through
+    if isinstance(record, dict):
+        return record
+    case = record.case
+    row = {}
+    for column in case.layout:
+        if column is DETAILS:
+            row.update(case.details)
+        elif column in CaseRecord.FIELDS:
+            row[column] = getattr(case, CaseRecord.FIELDS[column])
+        else:
+            field = record.FIELDS.get(column)
+            row[column] = getattr(record, field) if field else ''
+    return row
+
+
+def flatten(records):
+    return [as_row(record) for record in records]
+
+
+def pack(rows):
+    """JSON form of one page's rows for the scrape manifest, with each case stored once.
+
+    Lists of plain row dicts are returned unchanged.
+    """
+    if not rows or isinstance(rows[0], dict):
+        return rows
+    cases = {}
+    packed_cases = []
+    entries = []
+    for record in rows:
+        case = record.case
+        if id(case) not in cases:
+            cases[id(case)] = len(packed_cases)
+            packed_cases.append([list(case.layout), case.number, case.title, case.summary,
+                                 case.environment, case.details])
+        entries.append([record.KIND, cases[id(case)]] + [getattr(record, field) for field in record.__slots__[1:]])
+    return {'cases': packed_cases, 'entries': entries}
+
+
+def unpack(data):
+    # Inverse of pack(); manifests written before records existed hold row dicts
+    if not isinstance(data, dict):
+        return data
+    cases = [CaseRecord(tuple(layout), *fields) for layout, *fields in data['cases']]
+    return [ENTRY_TYPES[kind](cases[case_index], *fields) for kind, case_index, *fields in data['entries']]
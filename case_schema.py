@@ -0,0 +1,106 @@
+from functools import lru_cache
+
+# What the exporters read from a case page, declared once. Each heading is
+# (name, tag, text, match): 'exact' compares the tag's string like
+# soup.find(tag, string=text), 'contains' is a substring test like
+# soup.find(tag, string=lambda x: x and text in x).
+CASE_PAGE_SCHEMA = {
+    'headings': [
+        ('case_number', 'font', 'Case Number', 'contains'),
+        ('environment', 'font', 'Environment', 'contains'),
+        ('summary', 'h4', 'Summary', 'exact'),
+        ('case_basics', 'h4', 'Case Basics', 'exact'),
+        ('product', 'h4', 'Product Information', 'exact'),
+        ('contact', 'h4', 'Contact Information', 'exact'),
+        ('case_feed', 'h4', 'Case Feed', 'exact'),
+        ('emails', 'b', 'Emails', 'exact'),
+    ],
+    # Label tables: (label substring, output column). Every rule whose label
+    # appears in a row's first cell sets that column, in order.
+    'label_columns': {
+        'product': [
+            ('Product Class', 'Product Class'),
+            ('Product Feature', 'Product Feature'),
+            ('Product Feature Version', 'Product Version'),
+        ],
+        'contact': [
+            ('Contact Name', 'Contact Name'),
+            ('Contact Email', 'Contact Email'),
+        ],
+    },
+    'email_header_widths': ["10%", "10%", "40%", "30%", "10%"],
+}
+
+
+class CompiledSchema:
+    """Matchers built once from a schema and reused for every case page."""
+
+    def __init__(self, schema):
+        self.tags = sorted({tag for _, tag, _, _ in schema['headings']})
+        self.exact = {}      # (tag, text) -> name
+        self.contains = []   # (tag, text, name)
+        for name, tag, text, match in schema['headings']:
+            if match == 'exact':
+                self.exact.setdefault((tag, text), name)
+            else:
+                self.contains.append((tag, text, name))
+        self.label_rules = {section: list(rules) for section, rules in schema['label_columns'].items()}
+        self.columns = {section: [column for _, column in rules] for section, rules in self.label_rules.items()}
+        self.email_header_widths = tuple(schema['email_header_widths'])
+        self._label_cache = {}
+
+    def locate(self, soup):
+        # First tag for every heading, found in a single pass over the tree
+        found = {}
+        wanted = len(self.exact) + len(self.contains)
+        for tag in soup.find_all(self.tags):
+            string = tag.string
+            if string is None:
+                continue
+            name = self.exact.get((tag.name, string))
+            if name is not None and name not in found:
+                found[name] = tag
+            for tag_name, text, name in self.contains:
+                if tag_name == tag.name and name not in found and text in string:
+                    found[name] = tag
+            if len(found) == wanted:
+                break
+        return found
+
+    def label_matches(self, section, label):
+        # Output columns a row label sets, memoized per distinct label
+        key = (section, label)
+        columns = self._label_cache.get(key)
+        if columns is None:
+            columns = [column for text, column in self.label_rules[section] if text in label]
+            self._label_cache[key] = columns
+        return columns
+
+    def label_values(self, section, table, get_text=lambda td: td.text.strip()):
+        values = dict.fromkeys(self.columns[section], '')
+        for row in table.find_all('tr'):
+            cols = row.find_all('td')
+            if len(cols) >= 2:
+                columns = self.label_matches(section, get_text(cols[0]))
+                if columns:
+                    value = get_text(cols[1])
+                    for column in columns:
+                        values[column] = value
+        return values
+
+    def is_email_header(self, tds):
+        return len(tds) == len(self.email_header_widths) and \
+            tuple(style_width(td.get('style', '')) for td in tds) == self.email_header_widths
+
+
+@lru_cache(maxsize=1024)
+def style_width(style):
+    # Last 'width:' declaration of an inline style, same rules as splitting on ';'
+    width = ''
+    for part in style.split(';'):
+        if 'width:' in part:
+            width = part.split('width:')[1].strip()
+    return width
+
+
+CASE_MATCHERS = CompiledSchema(CASE_PAGE_SCHEMA)
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Pending:
+    # A fetch that is in flight; later callers for the same key wait on it
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class CCRPageCache:
+    """Process-wide LRU + TTL cache of CCR pages, keyed by CCR number.
+
+    Concurrent lookups for the same CCR share a single upstream fetch.
+    Failed fetches are not cached.
+    """
+
+    def __init__(self, fetch, max_entries=256, ttl=600):
+        self.fetch = fetch
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # ccr_no -> (stored_at, html)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, ccr_no):
+        key = str(ccr_no).strip()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, html = entry
+                if time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return html
+                del self._entries[key]
+
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = _Pending()
+                self._pending[key] = pending
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            html = self.fetch(key)
+            pending.value = html
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                if pending.error is None and pending.value is not None:
+                    self._store(key, pending.value)
+                del self._pending[key]
+            pending.done.set()
+        return html
+
+    def peek(self, ccr_no):
+        # Cached page or None, without fetching
+        key = str(ccr_no).strip()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        return None
+
+    def put(self, ccr_no, html):
+        # Store a page fetched outside get(), e.g. by the async entry point
+        with self._lock:
+            self._store(str(ccr_no).strip(), html)
+
+    def _store(self, key, html):
+        self._entries[key] = (time.monotonic(), html)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, ccr_no=None):
+        with self._lock:
+            if ccr_no is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(ccr_no).strip(), None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,92 @@
+import csv
+import os
+
+from case_records import as_row
+
+
+class StreamingCSVWriter:
+    """Writes row dicts to CSV as they arrive and flushes after every batch.
+
+    Case records are flattened one row at a time as they are written.
+
+    Produces the same file as ``pd.DataFrame(rows).to_csv(path, index=False)``
+    for rows that share ``columns``. ``blank_columns`` are written empty
+    after the first row of a case (keyed by ``key``), including cases first
+    seen in an earlier batch. The file is only created once there is a row to
+    write.
+
+    ``resume_at`` continues an interrupted export: the file is cut back to
+    that byte position, a value returned by checkpoint(), and appended to
+    without a new header.
+    """
+
+    def __init__(self, path, columns=None, key='Case Number', blank_columns=(), encoding='utf-8-sig',
+                 resume_at=None):
+        self.path = path
+        self.resume_at = resume_at
+        self.columns = list(columns) if columns else None
+        self.key = key
+        self.blank_columns = tuple(blank_columns)
+        self.encoding = encoding
+        self.rows_written = 0
+        self._seen_keys = set()
+        self._file = None
+        self._writer = None
+
+    def _open(self):
+        if self.resume_at:
+            # Anything after the checkpoint belongs to cases that will be written again
+            os.truncate(self.path, self.resume_at)
+            if self.columns is None:
+                with open(self.path, newline='', encoding=self.encoding) as f:
+                    self.columns = next(csv.reader(f))
+            self._file = open(self.path, 'a', newline='', encoding=self.encoding)
+        else:
+            self._file = open(self.path, 'w', newline='', encoding=self.encoding)
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction='ignore',
+                                      lineterminator=os.linesep)
+        if not self.resume_at:
+            self._writer.writeheader()
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        if self._writer is None:
+            if self.columns is None:
+                self.columns = list(as_row(rows[0]).keys())
+            self._open()
+        for row in rows:
+            row = as_row(row)
+            if self.blank_columns:
+                case_key = row.get(self.key, '')
+                if case_key in self._seen_keys:
+                    row = dict(row)
+                    for column in self.blank_columns:
+                        row[column] = ''
+                else:
+                    self._seen_keys.add(case_key)
+            self._writer.writerow(row)
+        self.rows_written += len(rows)
+        self._file.flush()
+
+    def checkpoint(self):
+        # Makes everything written so far durable and returns the file's size for resume_at
+        if self._file is None:
+            return self.resume_at or 0
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,100 @@
+import re
+import threading
+from datetime import datetime
+
+# Tried in this order; the first format that parses wins
+DATE_FORMATS = ['%m/%d/%Y, %H:%M:%S', '%d/%m/%Y, %H:%M:%S', '%d/%m/%Y %H:%M', '%Y/%d/%m %H:%M', '%Y-%m-%d %H:%M:%S',
+                '%A, %d %B %Y at %I:%M %p', '%A, %d %B %Y at %H:%M', '%d %B %Y %H:%M:%S']
+
+
+def _shape(fmt):
+    # Formats with the same shape can both accept one string (e.g. m/d vs d/m)
+    shape = fmt.replace('%Y', '9999')
+    shape = re.sub(r'%[mdHIMSy]', '99', shape)
+    return re.sub(r'%[AaBbp]', 'A', shape)
+
+
+class DateParser:
+    """strptime over DATE_FORMATS that learns which format each source uses.
+
+    Every source (email header, case feed, CCR note...) starts with the last
+    format that worked for it, so a miss costs one strptime instead of up to
+    eight. Results stay identical to trying the formats in order: a learned
+    format that shares its shape with an earlier format still lets the
+    earlier one win. Parsed strings are memoized.
+    """
+
+    def __init__(self, formats=DATE_FORMATS, cache_size=65536):
+        self.formats = list(formats)
+        shapes = [_shape(fmt) for fmt in self.formats]
+        self._shadowed_by = [[j for j in range(i) if shapes[j] == shapes[i]] for i in range(len(self.formats))]
+        self._learned = {}
+        self._cache = {}
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _strptime(self, date_str, i):
+        try:
+            return datetime.strptime(date_str, self.formats[i])
+        except ValueError:
+            return None
+
+    def _parse_uncached(self, date_str, source):
+        learned = self._learned.get(source)
+        if learned is not None:
+            d_obj = self._strptime(date_str, learned)
+            if d_obj is not None:
+                for j in self._shadowed_by[learned]:
+                    earlier = self._strptime(date_str, j)
+                    if earlier is not None:
+                        return earlier, j
+                return d_obj, learned
+
+        for i in range(len(self.formats)):
+            if i == learned:
+                continue
+            d_obj = self._strptime(date_str, i)
+            if d_obj is not None:
+                return d_obj, i
+        return None, None
+
+    def parse(self, date_str, source=None):
+        if not isinstance(date_str, str):
+            return None
+        try:
+            return self._cache[date_str]
+        except KeyError:
+            pass
+        d_obj, fmt_index = self._parse_uncached(date_str, source)
+        with self._lock:
+            if fmt_index is not None:
+                self._learned[source] = fmt_index
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            self._cache[date_str] = d_obj
+        return d_obj
+
+    def parse_many(self, date_strs):
+        """Parse a whole column at once: one vectorized pandas call per format.
+
+        Returns a pandas Series of Timestamps (NaT where no format matched),
+        with the same format priority as parse().
+        """
+        import pandas as pd
+
+        values = pd.Series(date_strs, dtype=object)
+        unique = pd.Series(values.dropna().unique(), dtype=object)
+        parsed = pd.Series(pd.NaT, index=unique.index, dtype='datetime64[ns]')
+        remaining = unique.map(lambda x: isinstance(x, str))
+        for fmt in self.formats:
+            if not remaining.any():
+                break
+            attempt = pd.to_datetime(unique[remaining], format=fmt, errors='coerce')
+            hit = attempt.notna()
+            parsed[hit[hit].index] = attempt[hit]
+            remaining[hit[hit].index] = False
+        lookup = dict(zip(unique, parsed))
+        return values.map(lambda x: lookup.get(x, pd.NaT)).astype('datetime64[ns]')
+
+
+DATE_PARSER = DateParser()
@@ -0,0 +1,48 @@
+HEADER_CELLS = 5
+
+
+def _td_counts(table):
+    # Number of <td> descendants of every <tr> in the table, in one pass
+    counts = {}
+    for td in table.find_all('td'):
+        parent = td.parent
+        while parent is not None:
+            if parent.name == 'tr':
+                counts[id(parent)] = counts.get(id(parent), 0) + 1
+            if parent is table:
+                break
+            parent = parent.parent
+    return counts
+
+
+def iter_email_rows(email_table):
+    """Yield (header_cells, body_table) for each email header row of the Emails table.
+
+    A header row is a <tr> with five <td> descendants, and its body table is
+    the first <table> after it in document order, exactly what
+    ``row.find_next('table')`` returns. Both are found in a single walk
+    instead of one forward search per row.
+
+    The page repeats the email blocks two or three times. Repeated blocks are
+    recognised by the fingerprint of their header cells and skipped before
+    their bodies are read.
+    """
+    counts = _td_counts(email_table)
+    seen = set()
+    pending = []
+    for element in email_table.find_all(['tr', 'table']):
+        if element.name == 'table':
+            for row, cells in pending:
+                yield cells, element
+            pending = []
+        elif counts.get(id(element)) == HEADER_CELLS:
+            cells = element.find_all('td')
+            fingerprint = tuple(td.get_text() for td in cells)
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            pending.append((element, cells))
+
+    # Header rows after the last nested table pair with whatever follows the Emails table
+    for row, cells in pending:
+        yield cells, row.find_next('table')
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import os
+import tempfile
+
+# Raw pages are stored once per distinct body under objects/, gzip compressed
+# and named by their sha256. refs/ maps each fetched url to the body it
+# returned last, so identical pages reached through different urls share storage.
+CACHE_DIR = os.environ.get("CMP_HTML_CACHE", "html_cache")
+RECORD = os.environ.get("CMP_HTML_CACHE_RECORD", "1") != "0"
+REPLAY = os.environ.get("CMP_REPLAY", "0") == "1"
+
+
+def set_replay(enabled=True):
+    # In replay mode fetches are answered from the cache only, never the network
+    global REPLAY
+    REPLAY = enabled
+
+
+def set_record(enabled=True):
+    global RECORD
+    RECORD = enabled
+
+
+def content_digest(html_content):
+    return hashlib.sha256(html_content.encode('utf-8')).hexdigest()
+
+
+def _url_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+def _object_path(digest, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, "objects", digest[:2], digest + ".html.gz")
+
+
+def _ref_path(url, cache_dir=None):
+    key = _url_key(url)
+    return os.path.join(cache_dir or CACHE_DIR, "refs", key[:2], key)
+
+
+def _atomic_write(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store(url, html_content, cache_dir=None):
+    digest = content_digest(html_content)
+    object_path = _object_path(digest, cache_dir)
+    if not os.path.exists(object_path):
+        _atomic_write(object_path, gzip.compress(html_content.encode('utf-8'), compresslevel=6))
+    _atomic_write(_ref_path(url, cache_dir), f"{digest}\t{url}\n".encode('utf-8'))
+    return digest
+
+
+def lookup(url, cache_dir=None):
+    # Digest of the body last stored for url, or None
+    try:
+        with open(_ref_path(url, cache_dir), encoding='utf-8') as f:
+            return f.read().split("\t", 1)[0]
+    except FileNotFoundError:
+        return None
+
+
+def load_object(digest, cache_dir=None):
+    try:
+        with gzip.open(_object_path(digest, cache_dir), 'rb') as f:
+            return f.read().decode('utf-8')
+    except FileNotFoundError:
+        return None
+
+
+def load(url, cache_dir=None):
+    digest = lookup(url, cache_dir)
+    if digest is None:
+        return None
+    return load_object(digest, cache_dir)
+
+
+def iter_refs(cache_dir=None):
+    # Yields (url, digest) for every stored url
+    refs_dir = os.path.join(cache_dir or CACHE_DIR, "refs")
+    for root, _, files in os.walk(refs_dir):
+        for name in files:
+            if name.endswith(".tmp"):
+                continue
+            with open(os.path.join(root, name), encoding='utf-8') as f:
+                digest, url = f.read().rstrip("\n").split("\t", 1)
+            yield url, digest
+
+
+def iter_pages(cache_dir=None):
+    # Yields (url, html) for every stored url, read straight from disk
+    for url, digest in iter_refs(cache_dir):
+        html_content = load_object(digest, cache_dir)
+        if html_content is not None:
+            yield url, html_content
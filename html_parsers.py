@@ -0,0 +1,49 @@
+import os
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml
+except ImportError:  # lxml is optional, html.parser is always there
+    lxml = None
+
+# BeautifulSoup tree builders. html.parser ships with Python and is the
+# default; lxml is faster but repairs malformed markup (a missing </tr>)
+# differently, so the rows of such pages change with it.
+BACKENDS = ['html.parser', 'lxml']
+
+
+def available_backends():
+    return [name for name in BACKENDS if name != 'lxml' or lxml is not None]
+
+
+def default_backend():
+    # html.parser unless CMP_PARSER opts in to another backend for the run
+    requested = os.environ.get('CMP_PARSER')
+    if requested:
+        return check_backend(requested)
+    return 'html.parser'
+
+
+def check_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend {name!r}, expected one of {BACKENDS}")
+    if name not in available_backends():
+        raise ImportError(f"The {name} parser backend is not installed: pip install {name}")
+    return name
+
+
+PARSER = default_backend()
+
+
+def set_parser(name):
+    global PARSER
+    PARSER = check_backend(name)
+
+
+def make_soup(markup, parser=None):
+    # Line breaks are normalized to \n first, as HTML parsing specifies and lxml
+    # does, so every backend sees the same text
+    if isinstance(markup, str) and '\r' in markup:
+        markup = markup.replace('\r\n', '\n').replace('\r', '\n')
+    return BeautifulSoup(markup, parser or PARSER)
@@ -0,0 +1,201 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import html_cache
+
+CONNECT_TIMEOUT = 5      # seconds to establish the TCP connection
+READ_TIMEOUT = 60        # seconds to wait between bytes of the response
+MAX_RETRIES = 3          # retries after the first attempt
+BACKOFF_BASE = 0.5       # first retry waits up to this many seconds
+BACKOFF_CAP = 10         # no single wait is longer than this
+RETRY_STATUSES = {500, 502, 503, 504}
+POOL_CONNECTIONS = 8     # distinct hosts kept in the pool
+POOL_MAXSIZE = 32        # keep-alive connections per host
+
+
+class ReplayMiss(requests.exceptions.RequestException):
+    # Raised in replay mode when a url was never stored in the html cache
+    pass
+
+
+class FetchTiming:
+    def __init__(self, url, status, attempts, elapsed, size, error=None):
+        self.url = url
+        self.status = status
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.size = size
+        self.error = error
+
+    def __repr__(self):
+        return (f"FetchTiming({self.url!r}, status={self.status}, attempts={self.attempts}, "
+                f"elapsed={self.elapsed:.3f}s, size={self.size})")
+
+
+# Most recent fetches, newest last; listeners are called with every FetchTiming
+recent_fetches = deque(maxlen=1000)
+fetch_listeners = []
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def backoff_delay(attempt):
+    # Full jitter: a random wait between 0 and the capped exponential step
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _record(timing):
+    recent_fetches.append(timing)
+    for listener in fetch_listeners:
+        try:
+            listener(timing)
+        except Exception as e:
+            print(f"Fetch listener failed: {e}")
+
+
+def fetch_response(url, retries=MAX_RETRIES, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), headers=None):
+    """GET ``url`` on the shared session, retrying 5xx and connection errors.
+
+    Returns the last response, which may still carry a 5xx status once the
+    retries are spent. Connection errors and timeouts are re-raised after the
+    last attempt.
+    """
+    session = get_session()
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            response = session.get(url, timeout=timeout, headers=headers)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt >= retries:
+                _record(FetchTiming(url, None, attempt + 1, time.perf_counter() - started, 0, error=e))
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                _record(FetchTiming(url, response.status_code, attempt + 1,
+                                    time.perf_counter() - started, len(response.content)))
+                return response
+            response.close()
+        time.sleep(backoff_delay(attempt))
+        attempt += 1
+
+
+def fetch_text(url, raise_for_status=True, **kwargs):
+    if html_cache.REPLAY:
+        html_content = html_cache.load(url)
+        if html_content is None:
+            raise ReplayMiss(f"{url} is not in the html cache")
+        return html_content
+
+    response = fetch_response(url, **kwargs)
+    if raise_for_status:
+        response.raise_for_status()
+    html_content = response.text
+    if html_cache.RECORD and response.ok:
+        _store(url, html_content)
+    return html_content
+
+
+def _store(url, html_content):
+    try:
+        html_cache.store(url, html_content)
+    except OSError as e:
+        print(f"Could not cache {url}: {e}")
+
+
+_async_client = None
+_async_client_loop = None
+_httpx = False  # not imported yet
+
+
+def load_httpx():
+    # httpx is imported on the first async fetch, so sync-only processes never load it.
+    # Without httpx, fetch_text_async runs fetch_text on a thread.
+    global _httpx
+    if _httpx is False:
+        try:
+            import httpx
+        except ImportError:
+            httpx = None
+        _httpx = httpx
+    return _httpx
+
+
+def get_async_client():
+    # One pooled client per event loop; httpx clients cannot move between loops
+    global _async_client, _async_client_loop
+    httpx = load_httpx()
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        if _async_client is not None:
+            _close_async_client(_async_client, _async_client_loop)
+        _async_client_loop = loop
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE),
+        )
+    return _async_client
+
+
+def _close_async_client(client, loop):
+    # A client's connections belong to the loop it ran on, so it is closed
+    # there: right away if that loop is running in another thread, else when
+    # it runs again. A closed loop cannot run anything, so nothing is left to do.
+    if not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+
+async def fetch_text_async(url, raise_for_status=True, retries=MAX_RETRIES):
+    """Non-blocking fetch_text: same retries, timing, recording and replay.
+
+    Uses httpx when it is installed and otherwise runs fetch_text in a
+    thread. Errors are raised as requests exceptions in both cases.
+    """
+    httpx = load_httpx()
+    if httpx is None or html_cache.REPLAY:
+        return await asyncio.to_thread(fetch_text, url, raise_for_status)
+
+    client = get_async_client()
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            response = await client.get(url)
+        except httpx.TransportError as e:
+            if attempt >= retries:
+                _record(FetchTiming(url, None, attempt + 1, time.perf_counter() - started, 0, error=e))
+                raise requests.exceptions.ConnectionError(f"{url}: {e}") from e
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                _record(FetchTiming(url, response.status_code, attempt + 1,
+                                    time.perf_counter() - started, len(response.content)))
+                break
+        await asyncio.sleep(backoff_delay(attempt))
+        attempt += 1
+
+    if raise_for_status and response.is_error:
+        raise requests.exceptions.HTTPError(f"{response.status_code} Error for url: {url}")
+    html_content = response.text
+    if html_cache.RECORD and response.is_success:
+        _store(url, html_content)
+    return html_content
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import types
+
+import html_cache
+import http_fetch
+from case_records import pack, unpack
+
+MANIFEST_DIR = os.environ.get("CMP_MANIFEST", "scrape_manifest")
+
+
+class CaseManifest:
+    """Per-page record of the last scrape: validators, body hash and parsed rows.
+
+    Entries are keyed by parser and url, so each exporter script keeps its own
+    rows for the same case page.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or MANIFEST_DIR
+
+    def _path(self, parser_id, url):
+        key = hashlib.sha1(f"{parser_id}\n{url}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, parser_id, url):
+        try:
+            with open(self._path(parser_id, url), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, parser_id, url, entry):
+        path = self._path(parser_id, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class FetchedPage:
+    def __init__(self, url, html_content, digest, etag=None, last_modified=None, rows=None):
+        self.url = url
+        self.html = html_content
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.rows = rows  # previous rows when the page is unchanged
+        self.validators_changed = False
+
+
+class IncrementalScraper:
+    """fetch/parse pair for the batch engine that skips parsing unchanged pages.
+
+    fetch() sends the stored ETag/Last-Modified as a conditional request and
+    also compares the body hash, so servers without validators are covered.
+    parse() returns the stored rows for unchanged pages and only calls the
+    real parser for pages that changed.
+    """
+
+    def __init__(self, parse, manifest=None, version="1"):
+        self.parse_fn = parse
+        self.manifest = manifest or CaseManifest()
+        # Scripts run as __main__, so the source file tells the parsers apart.
+        # The content hash of that file and of the repo modules the parser
+        # uses is part of the id: after an edit to any of them, stored rows no
+        # longer match and every page is parsed again.
+        source = os.path.basename(parse.__code__.co_filename)
+        self.parser_id = f"{source}:{parse.__qualname__}:{version}:{code_digest(parse)}"
+        self.changed = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, url):
+        entry = self.manifest.get(self.parser_id, url)
+
+        if html_cache.REPLAY:
+            html_content = html_cache.load(url)
+            if html_content is None:
+                raise http_fetch.ReplayMiss(f"{url} is not in the html cache")
+            etag = last_modified = None
+        else:
+            headers = {}
+            if entry and entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry and entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            response = http_fetch.fetch_response(url, headers=headers or None)
+            if response.status_code == 304 and entry:
+                return FetchedPage(url, None, entry['digest'], entry.get('etag'),
+                                   entry.get('last_modified'), rows=unpack(entry['rows']))
+            response.raise_for_status()
+            html_content = response.text
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            http_fetch._store(url, html_content)
+
+        digest = html_cache.content_digest(html_content)
+        page = FetchedPage(url, html_content, digest, etag, last_modified)
+        if entry and entry.get('digest') == digest:
+            page.rows = unpack(entry['rows'])
+            page.validators_changed = (etag, last_modified) != (entry.get('etag'), entry.get('last_modified'))
+        return page
+
+    def parse(self, page):
+        rows = self.reuse(page)
+        if rows is None:
+            rows = self.record(page, self.parse_fn(page.html))
+        return rows
+
+    # parse() in two halves, for pipelines that parse in another process:
+    # reuse() and record() stay in this process, parse_page_html() runs remotely
+
+    def reuse(self, page):
+        # The stored rows of an unchanged page, else None
+        if page.rows is None:
+            return None
+        with self._lock:
+            self.unchanged += 1
+        if page.validators_changed:
+            # Same body as before but the server sent new validators
+            self._save(page, page.rows)
+        return page.rows
+
+    def record(self, page, rows):
+        self._save(page, rows)
+        with self._lock:
+            self.changed += 1
+        return rows
+
+    def _save(self, page, rows):
+        self.manifest.put(self.parser_id, page.url, {
+            'url': page.url,
+            'digest': page.digest,
+            'etag': page.etag,
+            'last_modified': page.last_modified,
+            'rows': pack(rows),
+        })
+
+
+def code_digest(func):
+    # Hash of the source files the function's rows depend on, or of its bytecode when one cannot be read
+    digest = hashlib.sha1()
+    try:
+        for path in sorted(source_files(func)):
+            with open(path, 'rb') as f:
+                digest.update(os.path.basename(path).encode('utf-8'))
+                digest.update(hashlib.sha1(f.read()).digest())
+    except OSError:
+        return _code_hash(func.__code__).hexdigest()[:12]
+    return digest.hexdigest()[:12]
+
+
+def source_files(func):
+    """The function's own file plus the repo modules it uses, directly or through other code.
+
+    Names in the bytecode are followed through functions, classes, instances
+    of repo classes (CASE_MATCHERS), constants and modules used as a whole
+    (html_cache), so an edit to email_pairing.py or case_schema.py changes
+    the digest too.
+    Only modules next to the function's file count; libraries are not hashed.
+    """
+    own_file = os.path.abspath(func.__code__.co_filename)
+    root = os.path.dirname(own_file)
+    files = {own_file}
+    seen = set()
+    pending = [func]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, (staticmethod, classmethod)):
+            obj = obj.__func__
+        if isinstance(obj, types.ModuleType):
+            path = _repo_file(obj, root)
+            if path:
+                files.add(path)
+                pending.extend(vars(obj).values())
+        elif isinstance(obj, type):
+            path = _repo_file(sys.modules.get(obj.__module__), root)
+            if path:
+                files.add(path)
+                pending.extend(obj.__bases__)
+                pending.extend(vars(obj).values())
+        elif isinstance(obj, types.FunctionType):
+            path = _repo_file(sys.modules.get(obj.__module__), root)
+            if path or obj is func:
+                files.add(path or own_file)
+                namespace = obj.__globals__
+                for name in _code_names(obj.__code__) & namespace.keys():
+                    value = namespace[name]
+                    if not isinstance(value, (types.ModuleType, type, types.FunctionType, types.BuiltinFunctionType)):
+                        # Constants such as HEADER_CELLS only lead back to their module by name
+                        files.update(_binding_files(name, value, root))
+                    pending.append(value)
+        elif isinstance(obj, property):
+            pending.extend(f for f in (obj.fget, obj.fset, obj.fdel) if f)
+        else:
+            pending.append(type(obj))
+    return files
+
+
+def _repo_file(module, root):
+    path = getattr(module, '__file__', None)
+    if path and os.path.dirname(os.path.abspath(path)) == root:
+        return os.path.abspath(path)
+    return None
+
+
+def _binding_files(name, value, root):
+    # Repo modules that bind name to this same object, where it is defined or imported
+    for module in list(sys.modules.values()):
+        path = _repo_file(module, root)
+        if path and vars(module).get(name, _binding_files) is value:
+            yield path
+
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            names |= _code_names(const)
+    return names
+
+
+def _code_hash(code, digest=None):
+    # Nested code objects (inner functions, comprehensions) are hashed by content, not repr
+    digest = digest or hashlib.sha1()
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode('utf-8'))
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _code_hash(const, digest)
+        else:
+            digest.update(repr(const).encode('utf-8'))
+    return digest
+
+
+def parse_page_html(parse, page):
+    # Picklable parse step for a FetchedPage: functools.partial(parse_page_html, parse_case)
+    return parse(page.html)
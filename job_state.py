@@ -0,0 +1,138 @@
+import hashlib
+import sqlite3
+import time
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    case_no TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER,
+    error TEXT,
+    updated REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class JobState:
+    """Per-case progress of a batch run, kept in a SQLite file so a restarted run resumes.
+
+    Cases are pending, done or failed. record() updates a case and commits
+    every ``batch_size`` cases. Before each commit the output is checkpointed
+    (flushed to disk), and its position is stored with the batch. A run that
+    dies loses at most the uncommitted batch: those cases are still pending,
+    and the output is cut back to the stored position before appending.
+    Failed cases are retried on later runs until they reach ``max_attempts``.
+
+    The state belongs to one batch: start() with a different case list
+    starts over, and finish() clears it once no case is left to run, so the
+    next run of the same list is a fresh export.
+    """
+
+    def __init__(self, path, max_attempts=3, batch_size=100):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self._uncommitted = 0
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    @property
+    def output_position(self):
+        # Output position saved with the last committed batch, None for a new run
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'output_position'").fetchone()
+        return int(row[0]) if row else None
+
+    def start(self, case_numbers):
+        """Adds new cases as pending and returns the ones this run should process, in order.
+
+        Done cases and cases that used up their attempts are skipped.
+        """
+        case_numbers = [str(case_no) for case_no in case_numbers]
+        batch = hashlib.sha1('\n'.join(case_numbers).encode('utf-8')).hexdigest()
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'batch'").fetchone()
+        if row is None or row[0] != batch:
+            self._clear()
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('batch', ?)", (batch,))
+        self._db.executemany("INSERT OR IGNORE INTO cases (case_no, status) VALUES (?, ?)",
+                             ((case_no, PENDING) for case_no in case_numbers))
+        self._db.commit()
+        states = {case_no: (status, attempts) for case_no, status, attempts
+                  in self._db.execute("SELECT case_no, status, attempts FROM cases")}
+        runnable = []
+        for case_no in dict.fromkeys(case_numbers):
+            status, attempts = states[case_no]
+            if status == PENDING or (status == FAILED and attempts < self.max_attempts):
+                runnable.append(case_no)
+        return runnable
+
+    def finish(self):
+        """Clears the state when no case is left to run and returns True.
+
+        Otherwise the state is kept for the next run, which resumes the batch.
+        """
+        left = self._db.execute("SELECT COUNT(*) FROM cases WHERE status = ? OR (status = ? AND attempts < ?)",
+                                (PENDING, FAILED, self.max_attempts)).fetchone()[0]
+        if left:
+            return False
+        self._clear()
+        self._db.commit()
+        return True
+
+    def _clear(self):
+        self._db.execute("DELETE FROM cases")
+        self._db.execute("DELETE FROM meta")
+
+    def record(self, result, output=None):
+        # result is a batch_scraper.CaseResult; output has checkpoint(), e.g. StreamingCSVWriter
+        if result.ok:
+            self._db.execute("UPDATE cases SET status = ?, attempts = attempts + 1, rows = ?, error = NULL, "
+                             "updated = ? WHERE case_no = ?",
+                             (DONE, len(result.rows), time.time(), str(result.case_no)))
+        else:
+            self._db.execute("UPDATE cases SET status = ?, attempts = attempts + 1, error = ?, updated = ? "
+                             "WHERE case_no = ?",
+                             (FAILED, result.error, time.time(), str(result.case_no)))
+        self._uncommitted += 1
+        if self._uncommitted >= self.batch_size:
+            self.commit(output)
+
+    def commit(self, output=None):
+        # The output is on disk before the cases that produced it are marked done
+        if output is not None:
+            position = output.checkpoint()
+            if position is not None:
+                self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('output_position', ?)",
+                                 (str(position),))
+        self._db.commit()
+        self._uncommitted = 0
+
+    def counts(self):
+        counts = dict.fromkeys((PENDING, DONE, FAILED), 0)
+        counts.update(self._db.execute("SELECT status, COUNT(*) FROM cases GROUP BY status"))
+        return counts
+
+    def exhausted(self):
+        # Failed cases that later runs will not retry
+        return [row[0] for row in self._db.execute(
+            "SELECT case_no FROM cases WHERE status = ? AND attempts >= ? ORDER BY rowid",
+            (FAILED, self.max_attempts))]
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,173 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = []
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_label_text(self.labelnames, key)} {value}')
+        return lines
+
+
+class CallbackCounter:
+    # Counter whose values are read at scrape time, e.g. hits kept by a cache
+    def __init__(self, name, documentation, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect  # returns [(label values tuple, value)]
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for key, value in self.collect():
+            lines.append(f'{self.name}{_label_text(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self, **labels):
+        # (count, sum) for one label set
+        series = self._series.get(tuple(labels.get(name, '') for name in self.labelnames))
+        return (series[-1], series[-2]) if series else (0, 0.0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _label_text(self.labelnames + ('le',), key + (repr(bound),))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _label_text(self.labelnames + ('le',), key + ('+Inf',))
+                lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+                lines.append(f'{self.name}_sum{_label_text(self.labelnames, key)} {series[-2]}')
+                lines.append(f'{self.name}_count{_label_text(self.labelnames, key)} {series[-1]}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('cmp_stage_seconds', 'Time spent in each report and export stage.', ['stage'])
+FETCH_SECONDS = Histogram('cmp_fetch_seconds', 'Upstream fetch time including retries.', ['outcome'])
+FETCH_RETRIES = Counter('cmp_fetch_retries_total', 'Upstream fetch attempts beyond the first.')
+FETCH_BYTES = Counter('cmp_fetch_bytes_total', 'Bytes received from upstream.')
+
+
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def instrument(stage):
+    # Decorator form of timed()
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Laps:
+    # Times consecutive stages of one function without nesting them in blocks:
+    # each call records the time since the previous call (or creation)
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def __call__(self, stage):
+        now = time.perf_counter()
+        STAGE_SECONDS.observe(now - self.last, stage=stage)
+        self.last = now
+
+
+def observe_fetch(timing):
+    # http_fetch listener: one FetchTiming per fetch
+    outcome = 'error' if timing.error is not None else ('ok' if timing.status < 400 else 'http_error')
+    FETCH_SECONDS.observe(timing.elapsed, outcome=outcome)
+    if timing.attempts > 1:
+        FETCH_RETRIES.inc(timing.attempts - 1)
+    FETCH_BYTES.inc(timing.size)
+
+
+def register_cache(name, cache):
+    # Exposes the hits/misses/coalesced attributes a cache keeps itself
+    def collect():
+        return [((name, event), getattr(cache, event, 0)) for event in ('hits', 'misses', 'coalesced')]
+    return CallbackCounter('cmp_cache_events_total', 'Cache lookups by cache and outcome.',
+                           ['cache', 'event'], collect)
+
+
+def render_prometheus():
+    lines = []
+    seen = set()
+    for metric in REGISTRY:
+        rendered = metric.render()
+        if metric.name in seen:
+            rendered = rendered[2:]  # HELP/TYPE once per metric name
+        seen.add(metric.name)
+        lines += rendered
+    return '\n'.join(lines) + '\n'
+
+
+def stage_summary():
+    # One line per stage: calls, total and mean seconds
+    lines = []
+    for (stage,), series in sorted(STAGE_SECONDS._series.items()):
+        count, total = series[-1], series[-2]
+        lines.append(f"{stage:<24} {count:>8} calls {total:>10.3f}s total {total / count * 1000:>9.2f}ms mean")
+    return '\n'.join(lines)
@@ -0,0 +1,123 @@
+import datetime
+import os
+import re
+import shutil
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for the parquet output mode
+    pa = pq = None
+
+from case_records import as_row
+
+# Fields that are the same on every row of a case are stored dictionary encoded,
+# so each distinct value is written once per row group instead of once per email.
+CASE_FIELDS = [
+    'Case Number', 'Case Title', 'Environment', 'Case Summary',
+    'Product Class', 'Product Feature', 'Product Version',
+    'Contact Name', 'Contact Email',
+]
+ROW_FIELDS = [
+    'Email Name', 'Email Status', 'Email Subject', 'Email From', 'Email Date', 'Email Body',
+    'Case Feed Author', 'Case Feed Comment', 'Case Feed Timestamp',
+]
+METRIC_FIELDS = ['Business Days Since Previous', 'Case Turnaround Business Days']
+PARTITION_COLUMNS = {'case': 'Case Number', 'date': 'Export Date'}
+# Data files are numbered by the flush that wrote them
+PART_FILE = re.compile(r'part-(\d+)-\d+\.parquet$')
+
+
+def case_schema():
+    if pa is None:
+        raise ImportError("pyarrow is required for parquet output: pip install pyarrow")
+    dict_string = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [pa.field(name, dict_string) for name in CASE_FIELDS]
+        + [pa.field(name, pa.string()) for name in ROW_FIELDS]
+        + [pa.field(name, pa.int32()) for name in METRIC_FIELDS]
+        + [pa.field('Export Date', pa.string())]
+    )
+
+
+class ParquetCaseWriter:
+    """Writes parsed rows to a parquet dataset partitioned by case or export date.
+
+    Rows are buffered and written as one row group per ``rows_per_group`` rows.
+    Columns a parser does not produce are stored as nulls, so every exporter
+    writes the same schema.
+
+    A new export replaces the dataset at ``root_path`` on its first write.
+    ``resume_at``, a value returned by checkpoint(), continues an interrupted
+    export instead: files from later flushes are deleted and the rest kept.
+    """
+
+    def __init__(self, root_path, partition_by='case', rows_per_group=50000, export_date=None,
+                 resume_at=None):
+        if partition_by not in PARTITION_COLUMNS:
+            raise ValueError(f"partition_by must be one of {sorted(PARTITION_COLUMNS)}")
+        self.schema = case_schema()
+        self.root_path = root_path
+        self.partition_column = PARTITION_COLUMNS[partition_by]
+        self.rows_per_group = rows_per_group
+        self.export_date = export_date or datetime.date.today().isoformat()
+        self.rows_written = 0
+        self.resume_at = resume_at
+        self.parts = resume_at or 0
+        self._opened = False
+        self._buffer = []
+
+    def _open(self):
+        if not os.path.isdir(self.root_path):
+            self._opened = True
+            return
+        if self.resume_at:
+            for directory, _, files in os.walk(self.root_path):
+                for name in files:
+                    match = PART_FILE.match(name)
+                    if match and int(match.group(1)) >= self.resume_at:
+                        os.remove(os.path.join(directory, name))
+        else:
+            shutil.rmtree(self.root_path)
+        self._opened = True
+
+    def write_rows(self, rows):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.rows_per_group:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        # Case records stay compact in the buffer and are only flattened here
+        rows = [as_row(record) for record in self._buffer]
+        columns = {}
+        for field in self.schema:
+            if field.name == 'Export Date':
+                columns[field.name] = [self.export_date] * len(rows)
+            else:
+                columns[field.name] = [row.get(field.name) for row in rows]
+        table = pa.Table.from_pydict(columns, schema=self.schema)
+        if not self._opened:
+            self._open()
+        pq.write_to_dataset(table, self.root_path, partition_cols=[self.partition_column],
+                            basename_template=f"part-{self.parts:06d}-{{i}}.parquet",
+                            existing_data_behavior='overwrite_or_ignore')
+        self.parts += 1
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def checkpoint(self):
+        # Writes out the buffered rows and returns the flush count for resume_at
+        self.flush()
+        return self.parts
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
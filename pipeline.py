@@ -0,0 +1,206 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from batch_scraper import CaseResult, HostLimiter
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0          # summed per-item work time
+        self.max_queue = 0       # deepest the stage's input queue got
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, error=False):
+        now = time.perf_counter()
+        with self._lock:
+            if self.started is None:
+                self.started = now - elapsed
+            self.finished = now
+            self.items += 1
+            self.errors += error
+            self.busy += elapsed
+
+    def observe_queue(self, depth):
+        if depth > self.max_queue:
+            self.max_queue = depth
+
+    @property
+    def rate(self):
+        if not self.items or self.finished is None:
+            return 0.0
+        return self.items / max(self.finished - self.started, 1e-9)
+
+    def __str__(self):
+        mean = self.busy / self.items * 1000 if self.items else 0.0
+        return (f"{self.name:<6} {self.items:>6} items {self.errors:>4} errors {self.rate:>8.1f}/s "
+                f"{mean:>9.1f}ms mean  queue max {self.max_queue}")
+
+
+def available_cpus():
+    # CPUs this process may run on, which can be fewer than os.cpu_count() in a container
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _parse_in_worker(parse, payload):
+    # Runs in the process pool; errors come back as text so one bad page
+    # does not take the batch down
+    started = time.perf_counter()
+    try:
+        return parse(payload), None, time.perf_counter() - started
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", time.perf_counter() - started
+
+
+class Pipeline:
+    """Batch export in three stages joined by bounded queues.
+
+    Fetch threads download pages, a process pool parses them, and the caller
+    writes the results: run() yields a CaseResult per case in completion
+    order, so the loop consuming it is the single writer stage. A full queue
+    stalls the stage before it, so a slow parser or writer holds back the
+    fetchers instead of buffering the batch in memory.
+
+    ``parse(payload)`` runs in another process and must be picklable (a
+    module-level function or functools.partial of one). ``reuse(payload)``
+    may return rows for a payload that needs no parsing, and
+    ``record(payload, rows)`` is called with freshly parsed rows; both run
+    in this process, e.g. IncrementalScraper.reuse and .record.
+    """
+
+    def __init__(self, generate_url, fetch, parse, fetch_workers=8, parse_workers=None, per_host=4,
+                 queue_size=32, reuse=None, record=None):
+        self.generate_url = generate_url
+        self.fetch = fetch
+        self.parse = parse
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or available_cpus()
+        self.limiter = HostLimiter(per_host)
+        self.queue_size = queue_size
+        self.reuse = reuse
+        self.record = record
+        self.stats = {name: StageStats(name) for name in ('fetch', 'parse', 'write')}
+        self._stop = threading.Event()
+
+    def _put(self, q, item):
+        # Blocks while the queue is full (backpressure) unless the run was abandoned
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch_stage(self, cases, parse_q):
+        while True:
+            with self._cases_lock:
+                case_no = next(cases, _DONE)
+            if case_no is _DONE or self._stop.is_set():
+                self._put(parse_q, _DONE)
+                return
+            url = self.generate_url(case_no)
+            started = time.perf_counter()
+            payload = error = None
+            try:
+                with self.limiter(url):
+                    payload = self.fetch(url)
+                if not payload:
+                    error = "fetch failed"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started
+            self.stats['fetch'].record(elapsed, error is not None)
+            self._put(parse_q, (case_no, url, payload, error, elapsed))
+            self.stats['parse'].observe_queue(parse_q.qsize())
+
+    def _parse_stage(self, pool, parse_q, write_q):
+        try:
+            self._dispatch(pool, parse_q, write_q)
+        finally:
+            self._put(write_q, _DONE)
+
+    def _dispatch(self, pool, parse_q, write_q):
+        fetchers_left = self.fetch_workers
+        in_flight = {}
+        limit = self.parse_workers * 2
+        while (fetchers_left or in_flight) and not self._stop.is_set():
+            # Keep the pool busy, but never hold more than `limit` pages in it
+            while fetchers_left and len(in_flight) < limit:
+                try:
+                    item = parse_q.get(timeout=0 if in_flight else 0.1)
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    fetchers_left -= 1
+                    continue
+                case_no, url, payload, error, elapsed = item
+                rows = None
+                if error is None and self.reuse is not None:
+                    try:
+                        rows = self.reuse(payload)
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                if error is not None or rows is not None:
+                    self._put(write_q, (CaseResult(case_no, url, rows=rows, error=error, elapsed=elapsed), None))
+                    continue
+                in_flight[pool.submit(_parse_in_worker, self.parse, payload)] = item
+
+            if in_flight:
+                done, _ = wait(in_flight, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    case_no, url, payload, _, fetch_elapsed = in_flight.pop(future)
+                    try:
+                        rows, error, parse_elapsed = future.result()
+                    except Exception as e:  # the worker process died
+                        rows, error, parse_elapsed = None, f"{type(e).__name__}: {e}", 0.0
+                    self.stats['parse'].record(parse_elapsed, error is not None)
+                    result = CaseResult(case_no, url, rows=rows, error=error,
+                                        elapsed=fetch_elapsed + parse_elapsed)
+                    self._put(write_q, (result, payload if error is None else None))
+                    self.stats['write'].observe_queue(write_q.qsize())
+
+    def run(self, case_numbers):
+        cases = iter(case_numbers)
+        self._cases_lock = threading.Lock()
+        self._stop.clear()
+        parse_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size)
+
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as pool:
+            threads = [threading.Thread(target=self._fetch_stage, args=(cases, parse_q), daemon=True)
+                       for _ in range(self.fetch_workers)]
+            threads.append(threading.Thread(target=self._parse_stage, args=(pool, parse_q, write_q), daemon=True))
+            for thread in threads:
+                thread.start()
+
+            try:
+                while True:
+                    item = write_q.get()
+                    if item is _DONE:
+                        break
+                    result, parsed_payload = item
+                    started = time.perf_counter()
+                    if parsed_payload is not None and self.record is not None:
+                        self.record(parsed_payload, result.rows)
+                    yield result
+                    self.stats['write'].record(time.perf_counter() - started, not result.ok)
+            finally:
+                # Also reached when the consumer stops early: release every stage
+                self._stop.set()
+                for thread in threads:
+                    thread.join()
+
+    def report(self):
+        return '\n'.join(str(self.stats[name]) for name in ('fetch', 'parse', 'write'))
@@ -0,0 +1,161 @@
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedReport:
+    def __init__(self, body):
+        self.body = body.encode('utf-8')
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.stored_at = time.monotonic()
+
+
+class BuildBody:
+    """Response body over a build's chunks whose close() releases the build.
+
+    A WSGI server calls close() even when it never iterates the body (HEAD
+    requests, clients that disconnected, start_response failing), which a
+    generator's finally block does not cover.
+    """
+
+    def __init__(self, chunks, release):
+        self._chunks = chunks
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        try:
+            close = getattr(self._chunks, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._release()
+
+
+class _Build:
+    # A report being rendered; requests for the same case wait on it
+    def __init__(self):
+        self.done = threading.Event()
+        self.report = None
+        self.started = False
+
+
+class ReportCache:
+    """Per-case cache of rendered reports with a TTL and explicit invalidation.
+
+    acquire() returns a cached report, or waits for a build already in
+    flight for the same case. If neither exists, the caller receives a claim
+    and renders through build(), which streams the chunks and stores the
+    finished report. Once the body is iterated the render runs on its own
+    thread, so waiting requests get the report as soon as it is rendered,
+    not when the first client has read it, and a client that goes away
+    does not stop the build. A build that fails, is closed before it
+    started, or returns a result rejected by ``cacheable`` stores nothing.
+    Waiting requests then claim the build themselves. A request that waits
+    longer than ``wait_timeout`` gets (None, None) and should render
+    without the cache.
+    """
+
+    def __init__(self, render, ttl=120, max_entries=512, cacheable=lambda body: True, wait_timeout=120):
+        self.render = render
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.max_entries = max_entries
+        self.cacheable = cacheable
+        self._reports = OrderedDict()
+        self._builds = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def acquire(self, case_no):
+        key = str(case_no)
+        waited = False
+        while True:
+            with self._lock:
+                report = self._reports.get(key)
+                if report is not None:
+                    if time.monotonic() - report.stored_at < self.ttl:
+                        self._reports.move_to_end(key)
+                        if not waited:
+                            self.hits += 1
+                        return report, None
+                    del self._reports[key]
+                pending = self._builds.get(key)
+                if pending is None:
+                    pending = _Build()
+                    self._builds[key] = pending
+                    self.misses += 1
+                    return None, pending
+                self.coalesced += 1
+            if not pending.done.wait(self.wait_timeout):
+                return None, None
+            waited = True
+            if pending.report is not None:
+                return pending.report, None
+
+    def build(self, case_no, claim):
+        # BuildBody yielding the rendered chunks; the finished report is cached
+        return BuildBody(self._stream(case_no, claim), lambda: self._abandon(str(case_no), claim))
+
+    def _stream(self, case_no, claim):
+        # Starts the render on the first read and passes its chunks on at the client's pace
+        chunks = queue.SimpleQueue()
+        claim.started = True
+        threading.Thread(target=self._render, args=(case_no, claim, chunks.put), daemon=True).start()
+        while True:
+            chunk, error = chunks.get()
+            if error is not None:
+                raise error
+            if chunk is None:
+                return
+            yield chunk
+
+    def _render(self, case_no, claim, emit):
+        chunks = []
+        error = None
+        try:
+            for chunk in self.render(case_no):
+                chunks.append(chunk)
+                emit((chunk, None))
+            body = "".join(chunks)
+            if self.cacheable(body):
+                claim.report = CachedReport(body)
+        except Exception as e:
+            error = e
+        finally:
+            self._release(str(case_no), claim)
+            emit((None, error))
+
+    def _abandon(self, key, claim):
+        # A body closed before it was read never started its render; a started one finishes on its thread
+        if not claim.started:
+            self._release(key, claim)
+
+    def _release(self, key, claim):
+        # Stores the report, if any, and wakes the waiting requests; safe to call twice
+        with self._lock:
+            if self._builds.get(key) is not claim:
+                return
+            del self._builds[key]
+            if claim.report is not None:
+                self._reports[key] = claim.report
+                self._reports.move_to_end(key)
+                while len(self._reports) > self.max_entries:
+                    self._reports.popitem(last=False)
+        claim.done.set()
+
+    def invalidate(self, case_no=None):
+        with self._lock:
+            if case_no is None:
+                self._reports.clear()
+            else:
+                self._reports.pop(str(case_no), None)
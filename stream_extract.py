@@ -0,0 +1,393 @@
+from html import unescape
+from html.parser import HTMLParser
+
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
+
+from case_records import CASE_FEED_COLUMNS, CaseRecord, EmailRecord, FeedRecord, hash_content
+from case_schema import CASE_MATCHERS
+from email_pairing import HEADER_CELLS
+
+# Same tree rules as BeautifulSoup's html.parser builder
+VOID_TAGS = HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS
+PRESERVE_WHITESPACE_TAGS = HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS
+# Strings inside these tags are not part of get_text()
+HIDDEN_TEXT_TAGS = set(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+def text_of(parts):
+    # tag.text
+    return ''.join(parts)
+
+
+def stripped_text_of(parts):
+    # tag.get_text(separator=' ', strip=True)
+    return ' '.join(s for s in (p.strip() for p in parts) if s)
+
+
+class _Element:
+    __slots__ = ('name', 'children', 'string', 'captures', 'role', 'tds', 'seq')
+
+    def __init__(self, name, seq):
+        self.name = name
+        self.children = 0
+        self.string = None   # tag.string while the tag has a single child
+        self.captures = 0    # text captures opened by this element
+        self.role = None
+        self.tds = None      # text of every <td> below this <tr>
+        self.seq = seq
+
+
+class CaseStreamParser(HTMLParser):
+    """Extracts the rows of testing33.parse_case (html.parser backend) from html.parser events.
+
+    No tree is built. Only the open elements and the text of the cells,
+    headings and email bodies being read are kept. Email header rows
+    already seen are dropped as they close, so a repeated block is never
+    paired with its body. Feed the page in chunks with feed(), then call
+    close(), which returns the rows.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+        self.active = []        # text captures of the open elements, outermost first
+        self._data = []
+        self._hidden = 0        # open script/style/... elements
+        self._preserve = 0      # open pre/textarea elements
+        self._seq = 0
+        self._pending_cr = False
+
+        self.headings = {}
+        self.waiting = []       # (tag name, attribute test, callback) for find_next
+        self.case_number = self.case_title = self.case_summary = ''
+        self.email_table = self.feed_table = None
+        self.feed_header_skipped = False
+        self.email_row_seqs = set()     # open <tr> of each table, by sequence number
+        self.feed_row_seqs = set()
+        self.seen_headers = set()
+        self.pending_headers = []   # header cells waiting for the next <table>
+        self.body_waiters = []      # (table element, header cell lists) waiting for a <div>
+        self.email_rows = []
+        self.feed_rows = []         # (tr sequence, cells)
+
+    # Input ----------------------------------------------------------------
+
+    def feed(self, data):
+        # Line breaks are normalized like html_parsers.make_soup does,
+        # including a CR LF split across two chunks
+        if self._pending_cr:
+            data = '\r' + data
+            self._pending_cr = False
+        if data.endswith('\r'):
+            data = data[:-1]
+            self._pending_cr = True
+        if '\r' in data:
+            data = data.replace('\r\n', '\n').replace('\r', '\n')
+        super().feed(data)
+
+    def close(self):
+        if self._pending_cr:
+            self._pending_cr = False
+            super().feed('\n')
+        super().close()
+        self._flush()
+        while self.stack:
+            self._pop()
+        for cells in self.pending_headers:
+            self._add_email(cells, '')
+        self.pending_headers = []
+        for _, header_groups, _ in self.body_waiters:
+            for cells in header_groups:
+                self._add_email(cells, '')
+        self.body_waiters = []
+        return self.rows()
+
+    # Tree bookkeeping -----------------------------------------------------
+
+    def _add_child(self, string=None):
+        if self.stack:
+            parent = self.stack[-1]
+            parent.children += 1
+            parent.string = string if parent.children == 1 else None
+
+    def _flush(self, comment=False):
+        if not self._data:
+            return
+        data = ''.join(self._data)
+        self._data = []
+        if not self._preserve and not data.strip(ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        self._add_child(data)
+        if not comment and not self._hidden:
+            for capture in self.active:
+                capture.append(data)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._data.append(character if character is not None else '&' + name)
+
+    def handle_charref(self, name):
+        self._data.append(unescape(f'&#{name};'))
+
+    def handle_comment(self, data):
+        self._flush()
+        self._data.append(data)
+        self._flush(comment=True)
+
+    def handle_decl(self, decl):
+        self.handle_comment(decl[len('DOCTYPE '):])
+
+    def handle_pi(self, data):
+        self.handle_comment(data)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self._flush()
+            self._data.append(data[len('CDATA['):])
+            self._flush()
+        else:
+            self.handle_comment(data)
+
+    def _capture(self, element):
+        parts = []
+        self.active.append(parts)
+        element.captures += 1
+        return parts
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self._add_child()
+        self._seq += 1
+        element = _Element(tag, self._seq)
+        attrs = dict((key, '' if value is None else value) for key, value in attrs)
+        self._on_start(element, attrs)
+        if tag in VOID_TAGS:
+            # Never has children; closes at once
+            self._on_end(element)
+            return
+        self.stack.append(element)
+        if tag in HIDDEN_TEXT_TAGS:
+            self._hidden += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        # Like BeautifulSoup: close up to the most recent open tag of this name
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].name == tag:
+                while len(self.stack) > i:
+                    self._pop()
+                return
+
+    def _pop(self):
+        element = self.stack.pop()
+        if element.name in HIDDEN_TEXT_TAGS:
+            self._hidden -= 1
+        if element.name in PRESERVE_WHITESPACE_TAGS:
+            self._preserve -= 1
+        self._on_end(element)
+        if element.captures:
+            del self.active[-element.captures:]
+        if self.stack:
+            parent = self.stack[-1]
+            if parent.children == 1:
+                parent.string = element.string
+
+    # Extraction -----------------------------------------------------------
+
+    def _on_start(self, element, attrs):
+        tag = element.name
+        if self.waiting:
+            still_waiting = []
+            for name, test, callback in self.waiting:
+                if name == tag and test(attrs):
+                    callback(element)
+                else:
+                    still_waiting.append((name, test, callback))
+            self.waiting = still_waiting
+
+        if tag == 'table':
+            self._on_table(element)
+        elif tag == 'tr':
+            self._on_tr(element)
+        elif tag == 'td':
+            self._on_td(element)
+        elif tag == 'div' and self.body_waiters:
+            self._on_div(element)
+
+    def _on_end(self, element):
+        role = element.role
+        if element.name in CASE_MATCHERS.tags and len(self.headings) < len(CASE_MATCHERS.exact) + len(CASE_MATCHERS.contains):
+            self._check_heading(element)
+        if role is None:
+            return
+        if role == 'row':
+            # A row can belong to both tables when one is nested in the other
+            if element.seq in self.email_row_seqs:
+                self.email_row_seqs.discard(element.seq)
+                self._end_email_row(element)
+            if element.seq in self.feed_row_seqs and len(element.tds) >= 3:
+                self.feed_rows.append((element.seq, [text_of(td).strip() for td in element.tds[:3]]))
+            self.feed_row_seqs.discard(element.seq)
+        elif role == 'body_table':
+            self._end_body_table(element)
+        elif role == 'body_div':
+            self._end_body_div(element)
+        elif isinstance(role, tuple):
+            field, parts, stripped = role
+            setattr(self, field, stripped_text_of(parts) if stripped else text_of(parts).strip())
+
+    def _check_heading(self, element):
+        string = element.string
+        if string is None:
+            return
+        found = []
+        name = CASE_MATCHERS.exact.get((element.name, string))
+        if name is not None:
+            found.append(name)
+        for tag_name, text, name in CASE_MATCHERS.contains:
+            if tag_name == element.name and text in string:
+                found.append(name)
+        for name in found:
+            if name not in self.headings:
+                self.headings[name] = element
+                self._heading_found(name)
+
+    def _find_next(self, tag, callback, test=lambda attrs: True):
+        self.waiting.append((tag, test, callback))
+
+    def _read_text(self, field, stripped=False):
+        def start(element):
+            element.role = (field, self._capture(element), stripped)
+        return start
+
+    def _heading_found(self, name):
+        if name == 'case_number':
+            self._find_next('font', self._read_text('case_number'))
+            self._find_next('b', self._read_text('case_title'))
+        elif name == 'summary':
+            self._find_next('td', self._read_text('case_summary', stripped=True),
+                            lambda attrs: attrs.get('colspan') == '3')
+        elif name == 'emails':
+            self._find_next('table', self._start_email_table)
+        elif name == 'case_feed':
+            self._find_next('table', self._start_feed_table)
+
+    def _start_email_table(self, element):
+        self.email_table = element
+
+    def _start_feed_table(self, element):
+        self.feed_table = element
+
+    def _enclosing(self, table):
+        # True while `table` is open
+        return table is not None and any(e is table for e in self.stack)
+
+    def _on_table(self, element):
+        if self.pending_headers:
+            # Every header row waiting for a body pairs with the next table
+            element.role = 'body_table'
+            self.body_waiters.append((element, self.pending_headers, None))
+            self.pending_headers = []
+
+    def _on_tr(self, element):
+        if self._enclosing(self.email_table):
+            element.role = 'row'
+            element.tds = []
+            self.email_row_seqs.add(element.seq)
+        if self._enclosing(self.feed_table):
+            # The first row of the feed table is its header
+            element.role = 'row'
+            element.tds = []
+            if self.feed_header_skipped:
+                self.feed_row_seqs.add(element.seq)
+            self.feed_header_skipped = True
+
+    def _on_td(self, element):
+        # Every open row of the same table counts the cell, as
+        # row.find_all('td') would
+        parts = None
+        for open_element in self.stack:
+            if open_element.tds is not None and open_element.name == 'tr':
+                if parts is None:
+                    parts = self._capture(element)
+                open_element.tds.append(parts)
+
+    def _on_div(self, element):
+        for i, (table, header_groups, div) in enumerate(self.body_waiters):
+            if div is None and self._enclosing(table):
+                element.role = 'body_div'
+                self.body_waiters[i] = (table, header_groups, (element, self._capture(element)))
+
+    def _end_email_row(self, element):
+        if len(element.tds) != HEADER_CELLS:
+            return
+        fingerprint = tuple(text_of(td) for td in element.tds)
+        if fingerprint in self.seen_headers:
+            return
+        self.seen_headers.add(fingerprint)
+        self.pending_headers.append(fingerprint)
+
+    def _end_body_div(self, element):
+        for i, (table, header_groups, div) in enumerate(self.body_waiters):
+            if div is not None and div[0] is element:
+                body = stripped_text_of(div[1])
+                for cells in header_groups:
+                    self._add_email(cells, body)
+                del self.body_waiters[i]
+                return
+
+    def _end_body_table(self, element):
+        for i, (table, header_groups, div) in enumerate(self.body_waiters):
+            if table is element:
+                for cells in header_groups:
+                    self._add_email(cells, stripped_text_of(div[1]) if div else '')
+                del self.body_waiters[i]
+                return
+
+    def _add_email(self, cells, body):
+        self.email_rows.append([cell.strip() for cell in cells] + [body])
+
+    def rows(self):
+        parsed_data = []
+        seen_hashes = set()
+        case = CaseRecord(CASE_FEED_COLUMNS, self.case_number, self.case_title, self.case_summary)
+        for fields in self.email_rows:
+            body_hash = hash_content(fields)
+            if body_hash not in seen_hashes:
+                seen_hashes.add(body_hash)
+                parsed_data.append(EmailRecord(case, *fields))
+        for _, fields in sorted(self.feed_rows, key=lambda row: row[0]):
+            body_hash = hash_content(fields)
+            if body_hash not in seen_hashes:
+                seen_hashes.add(body_hash)
+                parsed_data.append(FeedRecord(case, *fields))
+        return parsed_data
+
+
+def parse_case_stream(chunks):
+    """Same rows as testing33.parse_case with the html.parser backend, without building a tree.
+
+    lxml repairs malformed markup (a missing </tr>) differently, so with
+    CMP_PARSER=lxml the two can disagree on such pages.
+
+    ``chunks`` is the page as one string or as an iterable of string pieces,
+    e.g. a streamed response's iter_content(decode_unicode=True).
+    """
+    parser = CaseStreamParser()
+    if isinstance(chunks, str):
+        chunks = [chunks]
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
@@ -0,0 +1,103 @@
+import random
+from datetime import datetime, timedelta
+
+WORDS = ("design layout netlist simulation crash license timing constraint library cell pin route "
+         "placement schematic symbol view waveform corner process voltage temperature log error "
+         "warning patch release hotfix customer workaround reproduce testcase attached update").split()
+SENDERS = ["a.kumar@example.com", "support@example.com", "j.smith@example.com", "r.lee@example.com"]
+ENGINEERS = ["Ravi Kumar", "John Smith", "Rachel Lee", "Maria Garcia"]
+DATE_FORMAT = '%m/%d/%Y, %H:%M:%S'
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _email_rows(rng, emails, body_words, start):
+    rows = []
+    for i in range(emails):
+        sent = start + timedelta(hours=7 * i + rng.randint(0, 5))
+        sender = SENDERS[i % len(SENDERS)]
+        rows.append(
+            '<tr>'
+            f'<td style="width:10%">E-{i + 1:05d}</td>'
+            f'<td style="width:10%">{"Sent" if i % 2 else "Received"}</td>'
+            f'<td style="width:40%">Re: {_text(rng, 6)}</td>'
+            f'<td style="width:30%">{sender}</td>'
+            f'<td style="width:10%">{sent.strftime(DATE_FORMAT)}</td>'
+            '</tr>\n'
+            f'<tr><td colspan="5"><table><tr><td><div>From: {sender} Subject: update {i + 1}<br>'
+            f'{_text(rng, body_words)}</div></td></tr></table></td></tr>\n')
+    return rows
+
+
+def case_page(case_no=46816635, emails=10, repeats=3, comments=5, jira_comments=2, body_words=120,
+              ccr_no=None, seed=0):
+    """A cdsinfo-style case page, shaped like the pages the extractors read.
+
+    The Emails table lists ``emails`` header/body pairs and then repeats the
+    whole block ``repeats`` times in total, as the real pages do. The Case
+    Feed has ``comments`` rows and Case Comments ``jira_comments`` rows.
+    Pass ``ccr_no`` to fill the Bug/Enh CCR cell. The same arguments always
+    give the same page.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 2, 9, 0, 0)
+    title = _text(rng, 5).capitalize()
+    email_block = ''.join(_email_rows(rng, emails, body_words, start))
+
+    parts = [
+        '<html><head><title>cdsinfo</title></head><body>\n',
+        f'<font>Case Number</font><font>{case_no}</font><b>{title}</b>\n',
+        'Would you like to associate an Article to this Case<table><tr><td>Subject</td>'
+        f'<td>xxxxxxxxxxxxxxxx{title}</td></tr></table>\n',
+        '<font>Environment</font><b>Linux RHEL8 x86_64</b>\n',
+        f'<table><tr><td>Description</td><td colspan="3">{_text(rng, body_words)}</td></tr>\n',
+        '<tr><td>Severity</td><td>2</td></tr></table>\n',
+        f'<h4>Summary</h4><table><tr><td colspan="3">{_text(rng, 30)}</td></tr></table>\n',
+        '<h4>Case Basics</h4><table><tr><td>Status</td><td>Open</td></tr>'
+        '<tr><td>Priority</td><td>High</td></tr></table>\n',
+        '<h4>Product Information</h4><table><tr><td>Product Class</td><td>Virtuoso</td></tr>'
+        '<tr><td>Product Feature</td><td>Layout</td></tr>'
+        '<tr><td>Product Feature Version</td><td>IC23.1</td></tr></table>\n',
+        '<h4>Contact Information</h4><table><tr><td>Contact Name</td><td>Jane Roe</td></tr>'
+        '<tr><td>Contact Email</td><td>jane.roe@example.com</td></tr></table>\n',
+        '<b>Emails</b>\n<table>\n',
+        '<tr><td style="width:10%">Name</td><td style="width:10%">Status</td>'
+        '<td style="width:40%">Subject</td><td style="width:30%">From</td>'
+        '<td style="width:10%">Date</td></tr>\n',
+    ]
+    parts += [email_block] * max(repeats, 1)
+    parts.append('</table>\nOpen Activities\n')
+
+    parts.append('<h4>Case Comments</h4><table><tr><th>Comment</th></tr>\n')
+    for i in range(jira_comments):
+        created = start + timedelta(days=i + 1, hours=2)
+        engineer = ENGINEERS[i % len(ENGINEERS)].ljust(19)
+        parts.append(f'<tr><td>Created By: {engineer} ({created.strftime(DATE_FORMAT)}) '
+                     f'JIRA-{1000 + i} {_text(rng, 20)}</td></tr>\n')
+    parts.append('</table>\n')
+
+    parts.append('<h4>Case Feed</h4><table><tr><th>Comment</th><th>Author</th><th>Date</th></tr>\n')
+    for i in range(comments):
+        posted = start + timedelta(days=i, hours=5)
+        parts.append(f'<tr><td>{_text(rng, 25)}</td><td>{ENGINEERS[i % len(ENGINEERS)]}</td>'
+                     f'<td>{posted.strftime(DATE_FORMAT)}</td></tr>\n')
+    parts.append('</table>\nRelated Articles\n')
+
+    parts.append(f'<table><tr><td>Bug/Enh CCR</td><td> {ccr_no if ccr_no else ""} </td></tr></table>\n')
+    parts.append('</body></html>\n')
+    return ''.join(parts)
+
+
+def ccr_page(notes=5, body_words=60, seed=0):
+    # The CCR page read by extract_ccr_desc and extract_notes
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 3, 8, 0, 0)
+    parts = ['<html><body><pre>DESCRIPTION\n', _text(rng, body_words), '\nNOTES\n']
+    for i in range(notes):
+        appended = start + timedelta(days=i)
+        parts.append(f'Appended by: {ENGINEERS[i % len(ENGINEERS)]} On: {appended.strftime(DATE_FORMAT)} ====\n')
+        parts.append(_text(rng, body_words) + '\n')
+    parts.append('AUDIT TRAIL\nstatus changed</pre></body></html>\n')
+    return ''.join(parts)
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from report_cache import ReportCache
+
+
+def render(case_no):
+    yield f"<p>{case_no}</p>"
+    yield "<p>done</p>"
+
+
+def test_closing_unstarted_body_releases_the_build():
+    cache = ReportCache(render, wait_timeout=1)
+    report, claim = cache.acquire('1')
+    body = cache.build('1', claim)
+    body.close()  # the server closed the body without iterating it
+
+    report, claim = cache.acquire('1')
+    assert report is None and claim is not None  # claimed again instead of waiting
+    assert "".join(cache.build('1', claim)) == "<p>1</p><p>done</p>"
+    report, claim = cache.acquire('1')
+    assert report.body == b"<p>1</p><p>done</p>"
+
+
+def test_waiters_wake_when_an_unstarted_body_is_closed():
+    cache = ReportCache(render, wait_timeout=5)
+    _, claim = cache.acquire('2')
+    body = cache.build('2', claim)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(cache.acquire('2')))
+    waiter.start()
+    body.close()
+    waiter.join(2)
+    assert not waiter.is_alive()
+    report, claim = results[0]
+    assert report is None and claim is not None
+
+
+def test_closing_a_finished_body_keeps_the_report():
+    cache = ReportCache(render)
+    _, claim = cache.acquire('3')
+    body = cache.build('3', claim)
+    assert list(body) == ["<p>3</p>", "<p>done</p>"]
+    body.close()
+    report, claim = cache.acquire('3')
+    assert claim is None and report.body == b"<p>3</p><p>done</p>"
+
+
+def test_a_stalled_client_does_not_hold_up_waiters():
+    cache = ReportCache(render, wait_timeout=2)
+    _, claim = cache.acquire('4')
+    body = cache.build('4', claim)
+    assert next(body) == "<p>4</p>"  # the client reads one chunk and stalls
+
+    report, claim = cache.acquire('4')
+    assert claim is None and report.body == b"<p>4</p><p>done</p>"
+    assert list(body) == ["<p>done</p>"]
+
+
+def test_closing_a_started_body_still_caches_the_report():
+    cache = ReportCache(render, wait_timeout=2)
+    _, claim = cache.acquire('5')
+    body = cache.build('5', claim)
+    next(body)
+    body.close()  # the client went away after the first chunk
+
+    report, claim = cache.acquire('5')
+    assert claim is None and report.body == b"<p>5</p><p>done</p>"
+
+
+def test_a_failed_render_raises_in_the_body_and_stores_nothing():
+    def failing(case_no):
+        yield "<p>partial</p>"
+        raise ValueError("upstream down")
+
+    cache = ReportCache(failing, wait_timeout=2)
+    _, claim = cache.acquire('6')
+    body = cache.build('6', claim)
+    assert next(body) == "<p>partial</p>"
+    with pytest.raises(ValueError):
+        next(body)
+    report, claim = cache.acquire('6')
+    assert report is None and claim is not None
@@ -0,0 +1,37 @@
+import pytest
+
+import html_parsers
+from case_records import flatten
+from stream_extract import parse_case_stream
+from synthetic_pages import case_page
+from testing33 import parse_case
+
+PAGE = case_page(emails=4, repeats=2, comments=3)
+PAGES = {
+    'page': PAGE,
+    'no </tr>': PAGE.replace('</tr>', ''),
+    'no </td>': PAGE.replace('</td>', ''),
+    'no </div>': PAGE.replace('</div>', ''),
+    'unclosed tables': PAGE.replace('</table>', '', 2),
+    'crlf': PAGE.replace('\n', '\r\n'),
+    'entities': PAGE.replace('Re: ', 'Re: &amp; &lt;x&gt; &#169; &nbsp'),
+}
+
+
+@pytest.fixture(autouse=True)
+def html_parser(monkeypatch):
+    # The stream parser follows html.parser's tree; lxml repairs malformed pages differently
+    monkeypatch.setattr(html_parsers, 'PARSER', 'html.parser')
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_stream_rows_match_tree_rows(name):
+    page = PAGES[name]
+    assert flatten(parse_case_stream(page)) == flatten(parse_case(page))
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_chunked_stream_rows_match_tree_rows(name):
+    page = PAGES[name]
+    chunks = (page[i:i + 37] for i in range(0, len(page), 37))
+    assert flatten(parse_case_stream(chunks)) == flatten(parse_case(page))
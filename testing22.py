@@ -1,20 +1,24 @@
-import requests
+from http_fetch import fetch_text
 import pandas as pd
-from bs4 import BeautifulSoup
+from html_parsers import make_soup
 import hashlib
+from email_pairing import iter_email_rows
+from case_records import DETAILS, EMAIL_COLUMNS, CaseRecord, EmailRecord, flatten
+from case_schema import CASE_MATCHERS
 import warnings
 
 warnings.filterwarnings("ignore")
 
+# Case basics and contact columns follow the email columns in each row
+ROW_LAYOUT = ('Case Number', 'Case Title', 'Case Summary') + EMAIL_COLUMNS + (DETAILS,)
+
 def generate_url(case_no):
     base_url = "http://cdsinfo.cadence.com/cgi-bin/cdsinfoprod?input="
     return f"{base_url}{case_no}&type=_&codmode=p"
 
 def fetch_html(url):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
+        return fetch_text(url)
     except Exception as e:
         print(f"Failed to fetch URL {url}: {e}")
         return None
@@ -23,19 +27,20 @@ def hash_content(content):
     return hashlib.md5(content.encode('utf-8')).hexdigest()
 
 def parse_case(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = make_soup(html_content)
     parsed_data = []
     seen_hashes = set()
+    headings = CASE_MATCHERS.locate(soup)
 
     # Extract Case Info
-    case_number_tag = soup.find('font', string=lambda x: x and 'Case Number' in x)
+    case_number_tag = headings.get('case_number')
     case_number = case_number_tag.find_next('font').text.strip() if case_number_tag else ''
 
     case_title_tag = case_number_tag.find_next('b') if case_number_tag else None
     case_title = case_title_tag.text.strip() if case_title_tag else ''
 
     # Summary
-    summary_section = soup.find('h4', string='Summary')
+    summary_section = headings.get('summary')
     case_summary = ''
     if summary_section:
         summary_td = summary_section.find_next('td', {'colspan': '3'})
@@ -44,7 +49,7 @@ def parse_case(html_content):
 
     # Case Basics
     case_basics = {}
-    basics_section = soup.find('h4', string='Case Basics')
+    basics_section = headings.get('case_basics')
     if basics_section:
         table = basics_section.find_next('table')
         if table:
@@ -58,7 +63,7 @@ def parse_case(html_content):
 
     # Contact Information
     contact_info = {}
-    contact_section = soup.find('h4', string='Contact Information')
+    contact_section = headings.get('contact')
     if contact_section:
         table = contact_section.find_next('table')
         if table:
@@ -70,48 +75,35 @@ def parse_case(html_content):
                     value = cols[1].text.strip()
                     contact_info[key] = value
 
+    case = CaseRecord(ROW_LAYOUT, case_number, case_title, case_summary,
+                      details={**case_basics, **contact_info})
+
     # Emails Section
-    emails_section = soup.find('b', string='Emails')
+    emails_section = headings.get('emails')
     if emails_section:
         email_table = emails_section.find_next('table')
         if email_table:
-            email_rows = email_table.find_all('tr')
-            for row in email_rows:
-                cols = row.find_all('td')
-                if len(cols) == 5:
-                    email_name = cols[0].text.strip()
-                    email_status = cols[1].text.strip()
-                    email_subject = cols[2].text.strip()
-                    email_from = cols[3].text.strip()
-                    email_date = cols[4].text.strip()
-
-                    # Fetch the corresponding email body
-                    next_table = row.find_next('table')
-                    email_body = ''
-                    if next_table:
-                        body_div = next_table.find('div')
-                        if body_div:
-                            email_body = body_div.get_text(separator=' ', strip=True)
-
-                    # Hash email body to avoid duplicates
-                    body_hash = hash_content(email_body)
-                    if body_hash not in seen_hashes:
-                        seen_hashes.add(body_hash)
-
-                        row_data = {
-                            'Case Number': case_number,
-                            'Case Title': case_title,
-                            'Case Summary': case_summary,
-                            'Email Name': email_name,
-                            'Email Status': email_status,
-                            'Email Subject': email_subject,
-                            'Email From': email_from,
-                            'Email Date': email_date,
-                            'Email Body': email_body,
-                        }
-                        row_data.update(case_basics)
-                        row_data.update(contact_info)
-                        parsed_data.append(row_data)
+            for cols, next_table in iter_email_rows(email_table):
+                email_name = cols[0].text.strip()
+                email_status = cols[1].text.strip()
+                email_subject = cols[2].text.strip()
+                email_from = cols[3].text.strip()
+                email_date = cols[4].text.strip()
+
+                # Body table paired with this header row
+                email_body = ''
+                if next_table:
+                    body_div = next_table.find('div')
+                    if body_div:
+                        email_body = body_div.get_text(separator=' ', strip=True)
+
+                # Hash email body to avoid duplicates
+                body_hash = hash_content(email_body)
+                if body_hash not in seen_hashes:
+                    seen_hashes.add(body_hash)
+
+                    parsed_data.append(EmailRecord(case, email_name, email_status, email_subject,
+                                                   email_from, email_date, email_body))
     return parsed_data
 
 def main():
@@ -127,7 +119,7 @@ def main():
             all_data.extend(case_data)
 
     if all_data:
-        df = pd.DataFrame(all_data)
+        df = pd.DataFrame(flatten(all_data))
         df.to_csv('final_cases_output.csv', index=False, encoding='utf-8-sig')
         print("✅ Scraping completed. File saved as 'final_cases_output.csv'.")
     else:
@@ -1,92 +1,91 @@
-import requests
-import pandas as pd
-from bs4 import BeautifulSoup
-import hashlib
+from http_fetch import fetch_listeners
+from html_parsers import make_soup
+from email_pairing import iter_email_rows
+from case_schema import CASE_MATCHERS
 import warnings
+from batch_scraper import iter_scrape_cases
+from functools import partial
+from incremental import IncrementalScraper, parse_page_html
+from pipeline import Pipeline
+from csv_stream import StreamingCSVWriter
+from parquet_export import ParquetCaseWriter
+from business_days import TIMELINE_COLUMNS, add_timeline_metrics
+from metrics import Laps, timed, observe_fetch, stage_summary
+from stream_extract import parse_case_stream
+from case_records import CASE_FEED_COLUMNS, CaseRecord, EmailRecord, FeedRecord, flatten, hash_content
+from job_state import JobState
 
 warnings.filterwarnings("ignore")
 
+WORKERS = 8     # concurrent case fetches
+PER_HOST = 4    # concurrent fetches against one upstream host
+OUTPUT_FORMAT = 'csv'           # 'csv' or 'parquet' (needs pyarrow)
+PARQUET_PARTITION_BY = 'case'   # 'case' or 'date'
+TIMELINE_METRICS = False        # add business-day gap and turnaround columns
+PARSE_MODE = 'tree'             # 'tree' or 'stream' (same rows from parser events, no DOM)
+PIPELINE = False                # parse in a process pool behind the fetch threads
+PARSE_WORKERS = None            # pipeline parse processes, default one per CPU
+JOB_STATE = 'final_cases_output.jobs.sqlite'  # progress of an unfinished batch; delete it to start over
+MAX_ATTEMPTS = 3                # runs that may try a failing case
+CHECKPOINT_EVERY = 100          # cases per committed batch
+
 def generate_url(case_no):
     base_url = "http://cdsinfo.cadence.com/cgi-bin/cdsinfoprod?input="
     return f"{base_url}{case_no}&type=_&codmode=p"
 
-def fetch_html(url):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.text
-    except Exception as e:
-        print(f"Failed to fetch URL {url}: {e}")
-        return None
-
-def hash_content(fields):
-    combined = ' '.join(fields)
-    return hashlib.md5(combined.encode('utf-8')).hexdigest()
-
 def parse_case(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
+    lap = Laps()
+    soup = make_soup(html_content)
     parsed_data = []
     seen_hashes = set()
+    headings = CASE_MATCHERS.locate(soup)
+    lap('parse_case.soup')
 
     # Extract Case Info
-    case_number_tag = soup.find('font', string=lambda x: x and 'Case Number' in x)
+    case_number_tag = headings.get('case_number')
     case_number = case_number_tag.find_next('font').text.strip() if case_number_tag else ''
 
     case_title_tag = case_number_tag.find_next('b') if case_number_tag else None
     case_title = case_title_tag.text.strip() if case_title_tag else ''
 
     # Summary
-    summary_section = soup.find('h4', string='Summary')
+    summary_section = headings.get('summary')
     case_summary = ''
     if summary_section:
         summary_td = summary_section.find_next('td', {'colspan': '3'})
         if summary_td:
             case_summary = summary_td.get_text(separator=' ', strip=True)
+    case = CaseRecord(CSV_COLUMNS, case_number, case_title, case_summary)
 
     # Emails Section
-    emails_section = soup.find('b', string='Emails')
+    emails_section = headings.get('emails')
     if emails_section:
         email_table = emails_section.find_next('table')
         if email_table:
-            email_rows = email_table.find_all('tr')
-            for row in email_rows:
-                cols = row.find_all('td')
-                if len(cols) == 5:
-                    email_name = cols[0].text.strip()
-                    email_status = cols[1].text.strip()
-                    email_subject = cols[2].text.strip()
-                    email_from = cols[3].text.strip()
-                    email_date = cols[4].text.strip()
-
-                    # Fetch the corresponding email body
-                    next_table = row.find_next('table')
-                    email_body = ''
-                    if next_table:
-                        body_div = next_table.find('div')
-                        if body_div:
-                            email_body = body_div.get_text(separator=' ', strip=True)
-
-                    body_hash = hash_content([email_name, email_status, email_subject, email_from, email_date, email_body])
-                    if body_hash not in seen_hashes:
-                        seen_hashes.add(body_hash)
-
-                        parsed_data.append({
-                            'Case Number': case_number,
-                            'Case Title': case_title,
-                            'Case Summary': case_summary,
-                            'Email Name': email_name,
-                            'Email Status': email_status,
-                            'Email Subject': email_subject,
-                            'Email From': email_from,
-                            'Email Date': email_date,
-                            'Email Body': email_body,
-                            'Case Feed Author': '',
-                            'Case Feed Comment': '',
-                            'Case Feed Timestamp': ''
-                        })
+            for cols, next_table in iter_email_rows(email_table):
+                email_name = cols[0].text.strip()
+                email_status = cols[1].text.strip()
+                email_subject = cols[2].text.strip()
+                email_from = cols[3].text.strip()
+                email_date = cols[4].text.strip()
+
+                # Body table paired with this header row
+                email_body = ''
+                if next_table:
+                    body_div = next_table.find('div')
+                    if body_div:
+                        email_body = body_div.get_text(separator=' ', strip=True)
+
+                body_hash = hash_content([email_name, email_status, email_subject, email_from, email_date, email_body])
+                if body_hash not in seen_hashes:
+                    seen_hashes.add(body_hash)
+
+                    parsed_data.append(EmailRecord(case, email_name, email_status, email_subject,
+                                                   email_from, email_date, email_body))
+    lap('parse_case.emails')
 
     # Case Feed Section
-    case_feed_section = soup.find('h4', string='Case Feed')
+    case_feed_section = headings.get('case_feed')
     if case_feed_section:
         feed_table = case_feed_section.find_next('table')
         if feed_table:
@@ -102,50 +101,82 @@ def parse_case(html_content):
                     if body_hash not in seen_hashes:
                         seen_hashes.add(body_hash)
 
-                        parsed_data.append({
-                            'Case Number': case_number,
-                            'Case Title': case_title,
-                            'Case Summary': case_summary,
-                            'Email Name': '',
-                            'Email Status': '',
-                            'Email Subject': '',
-                            'Email From': '',
-                            'Email Date': '',
-                            'Email Body': '',
-                            'Case Feed Author': feed_author,
-                            'Case Feed Comment': feed_comment,
-                            'Case Feed Timestamp': feed_time
-                        })
+                        parsed_data.append(FeedRecord(case, feed_author, feed_comment, feed_time))
+    lap('parse_case.case_feed')
 
     return parsed_data
 
-def clean_case_columns(df):
-    # Blank out duplicate case number, title, summary rows after first
-    for case_number in df['Case Number'].unique():
-        indices = df.index[df['Case Number'] == case_number].tolist()
-        for idx in indices[1:]:
-            df.at[idx, 'Case Number'] = ''
-            df.at[idx, 'Case Title'] = ''
-            df.at[idx, 'Case Summary'] = ''
-    return df
+# Column order of the CSV and of the flattened rows, shared with stream_extract
+CSV_COLUMNS = CASE_FEED_COLUMNS
+# Blanked after the first row of each case in the CSV
+CASE_COLUMNS = ['Case Number', 'Case Title', 'Case Summary']
 
 def main():
     case_numbers = ['46816635']  # Add more case numbers if needed
-    all_data = []
-
-    for case_no in case_numbers:
-        print(f"Processing Case: {case_no}")
-        url = generate_url(case_no)
-        html_content = fetch_html(url)
-        if html_content:
-            case_data = parse_case(html_content)
-            all_data.extend(case_data)
-
-    if all_data:
-        df = pd.DataFrame(all_data)
-        df = clean_case_columns(df)
-        df.to_csv('final_cases_output.csv', index=False, encoding='utf-8-sig')
-        print("✅ Scraping completed. File saved as 'final_cases_output.csv'.")
+    fetch_listeners.append(observe_fetch)
+
+    # A run restarted after a crash or with failures left to retry skips the
+    # finished cases and appends to the output; a completed batch starts over
+    state = JobState(JOB_STATE, max_attempts=MAX_ATTEMPTS, batch_size=CHECKPOINT_EVERY)
+    skipped = len(case_numbers)
+    case_numbers = state.start(case_numbers)
+    skipped -= len(case_numbers)
+    resume_at = state.output_position
+    if skipped:
+        print(f"Resuming: {skipped} cases already done or out of attempts")
+
+    # Unchanged pages reuse the rows from the previous run instead of being re-parsed
+    parse = parse_case_stream if PARSE_MODE == 'stream' else parse_case
+    scraper = IncrementalScraper(parse)
+    pipeline = None
+    if PIPELINE:
+        # Cases arrive in completion order; parse stage timings stay in the worker processes
+        pipeline = Pipeline(generate_url, scraper.fetch, partial(parse_page_html, parse),
+                            fetch_workers=WORKERS, parse_workers=PARSE_WORKERS, per_host=PER_HOST,
+                            reuse=scraper.reuse, record=scraper.record)
+        results = pipeline.run(case_numbers)
+    else:
+        results = iter_scrape_cases(case_numbers, generate_url, scraper.fetch, scraper.parse,
+                                    workers=WORKERS, per_host=PER_HOST)
+
+    if OUTPUT_FORMAT == 'parquet':
+        # Case fields are kept on every row and dictionary encoded instead of blanked
+        output_path = 'final_cases_output.parquet'
+        writer = ParquetCaseWriter(output_path, partition_by=PARQUET_PARTITION_BY, resume_at=resume_at)
+    else:
+        # Each case's rows are on disk as soon as it is parsed; case fields are
+        # blanked after a case's first row by the writer
+        output_path = 'final_cases_output.csv'
+        columns = CSV_COLUMNS + TIMELINE_COLUMNS if TIMELINE_METRICS else CSV_COLUMNS
+        writer = StreamingCSVWriter(output_path, columns=columns, blank_columns=CASE_COLUMNS,
+                                    resume_at=resume_at)
+
+    with state, writer:
+        for result in results:
+            print(f"Processing Case: {result.case_no}")
+            if result.ok:
+                rows = result.rows  # records; the writers flatten them into row dicts
+                if TIMELINE_METRICS:
+                    rows = add_timeline_metrics(flatten(rows), date_columns=('Email Date', 'Case Feed Timestamp'))
+                with timed('write'):
+                    writer.write_rows(rows)
+            else:
+                print(f"Case {result.case_no} failed: {result.error}")
+            state.record(result, writer)
+        state.commit(writer)
+        counts = state.counts()
+        exhausted = state.exhausted()
+        state.finish()
+    print(f"{scraper.changed} changed, {scraper.unchanged} unchanged cases")
+    print(f"{counts['done']} done, {counts['failed']} failed, {counts['pending']} pending cases in {JOB_STATE}")
+    if exhausted:
+        print(f"Not retried after {MAX_ATTEMPTS} attempts: {', '.join(exhausted)}")
+    print(stage_summary())
+    if pipeline is not None:
+        print(pipeline.report())
+
+    if writer.rows_written or resume_at:
+        print(f"✅ Scraping completed. File saved as '{output_path}'.")
     else:
         print("⚠️ No data extracted.")
 